@@ -1,5 +1,8 @@
+from typing import AsyncIterator
+
 import fastapi
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from soul_diary.backend.api.exceptions import HTTPNotAuthenticated
 from soul_diary.backend.api.settings import APISettings
@@ -7,6 +10,9 @@ from soul_diary.backend.database import DatabaseService
 from soul_diary.backend.database.models import Session
 
 
+READ_ONLY_METHODS = frozenset(("GET", "HEAD"))
+
+
 async def database(request: fastapi.Request) -> DatabaseService:
     return request.app.service.database
 
@@ -15,15 +21,33 @@ async def settings(request: fastapi.Request) -> APISettings:
     return request.app.service.settings
 
 
+async def if_none_match(request: fastapi.Request) -> frozenset[str]:
+    # If-None-Match uses the weak comparison, so "W/" prefixes are dropped.
+    header = request.headers.get("If-None-Match", "")
+    return frozenset(tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip())
+
+
+async def session(
+        request: fastapi.Request,
+        database: DatabaseService = fastapi.Depends(database),
+) -> AsyncIterator[AsyncSession]:
+    # One unit of work per request, shared by every dependency and the handler. The connection is
+    # checked out on the first query only. The exit runs after the response is sent, so
+    # handlers which write must commit before they return.
+    read_only = request.method in READ_ONLY_METHODS
+    async with database.session(read_only=read_only) as session:
+        yield session
+
+
 async def is_auth(
         database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
         credentials: HTTPAuthorizationCredentials = fastapi.Depends(HTTPBearer()),
 ) -> Session:
-    async with database.transaction() as session:
-        user_session = await database.get_user_session(
-            session=session,
-            token=credentials.credentials,
-        )
+    user_session = await database.get_user_session(
+        session=session,
+        token=credentials.credentials,
+    )
 
     if user_session is None:
         raise HTTPNotAuthenticated()
@@ -1,6 +1,14 @@
 import fastapi
 
 
+class HTTPNotModified(fastapi.HTTPException):
+    def __init__(self, headers: dict[str, str]):
+        super().__init__(
+            status_code=fastapi.status.HTTP_304_NOT_MODIFIED,
+            headers=headers,
+        )
+
+
 class HTTPRegistrationNotSupported(fastapi.HTTPException):
     def __init__(self):
         super().__init__(
@@ -17,6 +25,46 @@ class HTTPUserAlreadyExists(fastapi.HTTPException):
         )
 
 
+class HTTPInvalidImport(fastapi.HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=fastapi.status.HTTP_400_BAD_REQUEST,
+            detail="Invalid import data.",
+        )
+
+
+class HTTPInvalidCursor(fastapi.HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=fastapi.status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor.",
+        )
+
+
+class HTTPInvalidDateRange(fastapi.HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=fastapi.status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date range.",
+        )
+
+
+class HTTPInvalidEmotionTokens(fastapi.HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=fastapi.status.HTTP_400_BAD_REQUEST,
+            detail="Invalid emotion tokens.",
+        )
+
+
+class HTTPInvalidPreview(fastapi.HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=fastapi.status.HTTP_400_BAD_REQUEST,
+            detail="Invalid preview.",
+        )
+
+
 class HTTPNotAuthenticated(fastapi.HTTPException):
     def __init__(self):
         super().__init__(
@@ -39,3 +87,19 @@ class HTTPNotFound(fastapi.HTTPException):
             status_code=fastapi.status.HTTP_404_NOT_FOUND,
             detail="Not found.",
         )
+
+
+class HTTPBatchTooLarge(fastapi.HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=fastapi.status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Batch too large.",
+        )
+
+
+class HTTPTooManyRequests(fastapi.HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=fastapi.status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests.",
+        )
@@ -1,63 +1,109 @@
+import hashlib
+
 import fastapi
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from soul_diary.backend.api.settings import APISettings
-from soul_diary.backend.api.dependencies import database, is_auth, settings
+from soul_diary.backend.api.dependencies import (
+    database,
+    if_none_match,
+    is_auth,
+    session,
+    settings,
+)
 from soul_diary.backend.database import DatabaseService
+from soul_diary.backend.database.exceptions import PasswordHasherOverloaded
 from soul_diary.backend.database.models import Session
 from .exceptions import (
     HTTPNotAuthenticated,
+    HTTPNotFound,
+    HTTPNotModified,
     HTTPRegistrationNotSupported,
+    HTTPTooManyRequests,
     HTTPUserAlreadyExists,
 )
-from .schemas import CredentialsRequest, OptionsResponse, TokenResponse
+from .schemas import CredentialsRequest, OptionsResponse, StatsResponse, TokenResponse
+
+
+async def options(
+        response: fastapi.Response,
+        settings: APISettings = fastapi.Depends(settings),
+        if_none_match: frozenset[str] = fastapi.Depends(if_none_match),
+) -> OptionsResponse:
+    options = OptionsResponse(registration_enabled=settings.registration_enabled)
+
+    options_hash = hashlib.sha256(options.model_dump_json().encode()).hexdigest()
+    headers = {
+        "ETag": f'"{options_hash[:16]}"',
+        "Cache-Control": f"public, max-age={settings.options_cache_max_age}",
+    }
+    if headers["ETag"] in if_none_match or "*" in if_none_match:
+        raise HTTPNotModified(headers=headers)
+    response.headers.update(headers)
 
+    return options
 
-async def options(settings: APISettings = fastapi.Depends(settings)) -> OptionsResponse:
-    return OptionsResponse(registration_enabled=settings.registration_enabled)
+
+async def stats(
+        settings: APISettings = fastapi.Depends(settings),
+        database: DatabaseService = fastapi.Depends(database),
+) -> StatsResponse:
+    if not settings.stats_enabled:
+        raise HTTPNotFound()
+
+    return StatsResponse(database=database.get_stats())
 
 
 async def sign_up(
         data: CredentialsRequest = fastapi.Body(...),
         settings: APISettings = fastapi.Depends(settings),
         database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
 ) -> TokenResponse:
     if not settings.registration_enabled:
         raise HTTPRegistrationNotSupported()
 
     try:
-        async with database.transaction() as session:
-            user = await database.create_user(
-                session=session,
-                username=data.username,
-                password=data.password,
-            )
+        user = await database.create_user(
+            session=session,
+            username=data.username,
+            password=data.password,
+        )
+        await session.commit()
     except IntegrityError:
         raise HTTPUserAlreadyExists()
+    except PasswordHasherOverloaded:
+        raise HTTPTooManyRequests()
     user_session = user.sessions[0]
 
-    return TokenResponse(token=user_session.token)
+    return TokenResponse(token=database.get_token(user_session=user_session))
 
 
 async def sign_in(
         data: CredentialsRequest = fastapi.Body(...),
         database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
 ) -> TokenResponse:
-    async with database.transaction() as session:
+    try:
         user_session = await database.auth_user(
             session=session,
             username=data.username,
             password=data.password,
         )
+    except PasswordHasherOverloaded:
+        raise HTTPTooManyRequests()
     if user_session is None:
         raise HTTPNotAuthenticated()
+    await session.commit()
 
-    return TokenResponse(token=user_session.token)
+    return TokenResponse(token=database.get_token(user_session=user_session))
 
 
 async def logout(
         database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
         user_session: Session = fastapi.Depends(is_auth),
 ):
-    async with database.transaction() as session:
-        await database.logout_user(session=session, user_session=user_session)
+    await database.logout_user(session=session, user_session=user_session)
+    await session.commit()
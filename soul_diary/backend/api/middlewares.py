@@ -0,0 +1,157 @@
+import zlib
+
+from fastapi.utils import is_body_allowed_for_status_code
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from soul_diary.backend.database import DatabaseService
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class DatabaseCheckoutsMiddleware:
+    HEADER = "X-Database-Checkouts"
+
+    def __init__(self, app: ASGIApp, database: DatabaseService):
+        self._app = app
+        self._database = database
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+
+        with self._database.count_checkouts() as counter:
+            async def send_with_checkouts(message: Message):
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append(self.HEADER, str(counter.count))
+                await send(message)
+
+            await self._app(scope, receive, send_with_checkouts)
+
+
+class GzipEncoder:
+    ENCODING = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    ENCODING = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    # Event streams are excluded: a compressor holds data back until its buffer fills, and
+    # events must reach the client as soon as they are sent. Raw ciphertexts don't compress.
+    EXCLUDED_MEDIA_TYPES = frozenset(("text/event-stream", "application/octet-stream"))
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 1024,
+            gzip_level: int = 6,
+            brotli_quality: int = 4,
+    ):
+        self._app = app
+        self._minimum_size = minimum_size
+        self._gzip_level = gzip_level
+        self._brotli_quality = brotli_quality
+
+    def get_encoder(self, accept_encoding: str) -> GzipEncoder | BrotliEncoder | None:
+        encodings = set()
+        for item in accept_encoding.lower().replace(" ", "").split(","):
+            encoding, _, quality = item.partition(";q=")
+            try:
+                if float(quality or 1) > 0:
+                    encodings.add(encoding)
+            except ValueError:
+                continue
+
+        if brotli is not None and BrotliEncoder.ENCODING in encodings:
+            return BrotliEncoder(quality=self._brotli_quality)
+        if GzipEncoder.ENCODING in encodings:
+            return GzipEncoder(level=self._gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+
+        encoder = self.get_encoder(Headers(scope=scope).get("Accept-Encoding", ""))
+        if encoder is None:
+            await self._app(scope, receive, send)
+            return
+
+        start_message = None
+        compressing = None
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, compressing
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("Content-Type", "").partition(";")[0].strip()
+                if ("Content-Encoding" in headers or
+                        media_type in self.EXCLUDED_MEDIA_TYPES or
+                        not is_body_allowed_for_status_code(message["status"])):
+                    compressing = False
+                    await send(start_message)
+                return
+            if message["type"] != "http.response.body" or compressing is False:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressing is None:
+                if not more_body and len(body) < self._minimum_size:
+                    compressing = False
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressing = True
+                headers = MutableHeaders(scope=start_message)
+                headers["Content-Encoding"] = encoder.ENCODING
+                headers.add_vary_header("Accept-Encoding")
+                del headers["Content-Length"]
+                # The compressed body is another representation, so its tag can only be weak.
+                etag = headers.get("ETag")
+                if etag is not None and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                if not more_body:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            body = encoder.compress(body)
+            if not more_body:
+                body += encoder.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self._app(scope, receive, send_compressed)
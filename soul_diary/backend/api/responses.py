@@ -0,0 +1,54 @@
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Mapping
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_default(value: Any) -> str:
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content,
+        default=json_default,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    # Hot endpoints build plain dicts straight from rows and return this response, so FastAPI
+    # neither validates them against the response model nor runs jsonable_encoder.
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+class RawSenseResponse(Response):
+    # The ciphertext is the body as is, its metadata goes to headers.
+    media_type = "application/octet-stream"
+    ID_HEADER = "X-Sense-Id"
+    CREATED_AT_HEADER = "X-Sense-Created-At"
+    EMOTION_TOKENS_HEADER = "X-Sense-Emotion-Tokens"
+    PREVIEW_HEADER = "X-Sense-Preview"
+
+    def __init__(self, sense: Any, headers: Mapping[str, str] | None = None):
+        headers = {
+            **(headers or {}),
+            self.ID_HEADER: str(sense.id),
+            self.CREATED_AT_HEADER: sense.created_at.isoformat(),
+        }
+        super().__init__(content=sense.data, headers=headers)
@@ -12,4 +12,5 @@ router.add_api_route(path="/signup", methods=["POST"], endpoint=handlers.sign_up
 router.add_api_route(path="/signin", methods=["POST"], endpoint=handlers.sign_in)
 router.add_api_route(path="/logout", methods=["POST"], endpoint=handlers.logout)
 router.add_api_route(path="/options", methods=["GET"], endpoint=handlers.options)
+router.add_api_route(path="/stats", methods=["GET"], endpoint=handlers.stats)
 router.include_router(senses.router, prefix="/senses", tags=["Senses"])
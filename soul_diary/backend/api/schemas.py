@@ -1,5 +1,7 @@
 from pydantic import BaseModel, constr
 
+from soul_diary.backend.database.service import DatabaseStats
+
 
 class CredentialsRequest(BaseModel):
     username: constr(min_length=4, max_length=64, strip_whitespace=True)
@@ -7,8 +9,12 @@ class CredentialsRequest(BaseModel):
 
 
 class TokenResponse(BaseModel):
-    token: constr(min_length=32, max_length=32)
+    token: constr(min_length=32)
 
 
 class OptionsResponse(BaseModel):
     registration_enabled: bool
+
+
+class StatsResponse(BaseModel):
+    database: DatabaseStats
@@ -1,24 +1,132 @@
 import uuid
+from datetime import date, datetime
 
 import fastapi
+from pydantic import TypeAdapter
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from soul_diary.backend.api.dependencies import database, is_auth
-from soul_diary.backend.api.exceptions import HTTPForbidden, HTTPNotFound
+from soul_diary.backend.api.dependencies import database, if_none_match, is_auth, session
+from soul_diary.backend.api.exceptions import (
+    HTTPForbidden,
+    HTTPInvalidDateRange,
+    HTTPInvalidEmotionTokens,
+    HTTPInvalidPreview,
+    HTTPNotFound,
+    HTTPNotModified,
+)
+from soul_diary.backend.api.responses import RawSenseResponse
 from soul_diary.backend.database import DatabaseService
-from soul_diary.backend.database.models import Sense, Session
+from soul_diary.backend.database.models import Session
+from .schemas import EMOTION_TOKENS_MAX_COUNT, DateRange, EmotionToken, Preview, to_utc
+
+EMOTION_TOKEN_ADAPTER = TypeAdapter(EmotionToken)
+PREVIEW_ADAPTER = TypeAdapter(Preview)
+
+
+async def date_range(
+        created_from: datetime | date | None = fastapi.Query(None, alias="from"),
+        created_to: datetime | date | None = fastapi.Query(None, alias="to"),
+) -> DateRange:
+    date_range = DateRange(created_from=to_utc(created_from), created_to=to_utc(created_to))
+    if (date_range.created_from is not None and date_range.created_to is not None and
+            date_range.created_from >= date_range.created_to):
+        raise HTTPInvalidDateRange()
+
+    return date_range
+
+
+def parse_emotion_tokens(values: list[str]) -> list[bytes]:
+    if len(values) > EMOTION_TOKENS_MAX_COUNT:
+        raise HTTPInvalidEmotionTokens()
+    try:
+        return [EMOTION_TOKEN_ADAPTER.validate_python(value) for value in values]
+    except ValueError:
+        raise HTTPInvalidEmotionTokens()
+
+
+async def emotion_token(
+        emotion_token: str | None = fastapi.Query(None),
+) -> bytes | None:
+    if emotion_token is None:
+        return None
+
+    return parse_emotion_tokens([emotion_token])[0]
+
+
+async def emotion_tokens(
+        emotion_tokens: str | None = fastapi.Header(
+            None,
+            alias=RawSenseResponse.EMOTION_TOKENS_HEADER,
+        ),
+) -> list[bytes] | None:
+    # Raw bodies are the ciphertext alone, so their tokens come as a comma-separated header.
+    if emotion_tokens is None:
+        return None
+
+    values = [value.strip() for value in emotion_tokens.split(",")]
+    return parse_emotion_tokens([value for value in values if value])
+
+
+async def preview(
+        preview: str | None = fastapi.Header(None, alias=RawSenseResponse.PREVIEW_HEADER),
+) -> bytes | None:
+    if preview is None:
+        return None
+
+    try:
+        return PREVIEW_ADAPTER.validate_python(preview.strip())
+    except ValueError:
+        raise HTTPInvalidPreview()
+
+
+async def user_data(
+        response: fastapi.Response,
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        if_none_match: frozenset[str] = fastapi.Depends(if_none_match),
+) -> Row:
+    # Every write bumps the user's data version, so it tags every view of the user's senses.
+    # A matching tag is answered before `senses` is queried at all.
+    user_data = await database.get_user_data(session=session, user_id=user_session.user_id)
+
+    headers = {
+        "ETag": f'"{user_session.user_id.hex}.{user_data.data_version}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if headers["ETag"] in if_none_match or "*" in if_none_match:
+        raise HTTPNotModified(headers=headers)
+    response.headers.update(headers)
+
+    return user_data
 
 
 async def sense(
+        response: fastapi.Response,
         database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
         user_session: Session = fastapi.Depends(is_auth),
+        if_none_match: frozenset[str] = fastapi.Depends(if_none_match),
         sense_id: uuid.UUID = fastapi.Path(),
-) -> Sense:
-    async with database.transaction() as session:
-        sense = await database.get_sense(session=session, sense_id=sense_id)
-    
-    if sense is None:
+) -> Row:
+    # The owner is checked before the tag, so a foreign sense id isn't answered with 304, while
+    # a matching tag still skips reading the sense itself.
+    owner_id = await database.get_sense_owner(session=session, sense_id=sense_id)
+    if owner_id is None:
         raise HTTPNotFound()
-    if sense.user_id != user_session.user_id:
+    if owner_id != user_session.user_id:
         raise HTTPForbidden()
+    await user_data(
+        response=response,
+        database=database,
+        session=session,
+        user_session=user_session,
+        if_none_match=if_none_match,
+    )
+
+    sense = await database.get_sense(session=session, sense_id=sense_id)
+    if sense is None:
+        raise HTTPNotFound()
 
     return sense
@@ -1,81 +1,536 @@
+import asyncio
+import time
+import uuid
+
 import fastapi
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from soul_diary.backend.api.dependencies import database
+from soul_diary.backend.api.dependencies import database, session, settings
+from soul_diary.backend.api.exceptions import (
+    HTTPBatchTooLarge,
+    HTTPForbidden,
+    HTTPInvalidCursor,
+    HTTPInvalidImport,
+    HTTPNotFound,
+)
+from soul_diary.backend.api.responses import FastJSONResponse, RawSenseResponse, dump_json
+from soul_diary.backend.api.settings import APISettings
 from soul_diary.backend.database import DatabaseService
-from soul_diary.backend.database.models import Sense, Session
-from .dependencies import is_auth, sense
+from soul_diary.backend.database.exceptions import InvalidCursor
+from soul_diary.backend.database.service import CursorData, NewSense
+from soul_diary.backend.database.models import Session
+from .dependencies import (
+    date_range,
+    emotion_token,
+    emotion_tokens,
+    is_auth,
+    preview,
+    sense,
+    user_data,
+)
 from .schemas import (
+    BatchCreateSensesRequest,
+    BatchItemStatus,
+    BatchSensesRequest,
     CreateSenseRequest,
+    DateRange,
     Pagination,
-    SenseListResponse,
+    SenseBatchItem,
+    SenseBatchResponse,
+    SenseHistogramResponse,
+    SenseImportItem,
+    SenseImportResponse,
+    SenseMonth,
     SenseResponse,
     UpdateSenseRequest,
+    encode_base64,
 )
 
 
+def encode_optional(value: bytes | None) -> str | None:
+    return None if value is None else encode_base64(value)
+
+
+def sense_content(sense: Row) -> dict:
+    return {
+        "id": sense.id,
+        "data": encode_optional(sense.data),
+        "preview": encode_optional(sense.preview),
+        "created_at": sense.created_at,
+    }
+
+
 async def get_sense_list(
+        response: fastapi.Response,
         database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
         user_session: Session = fastapi.Depends(is_auth),
+        user_data: Row = fastapi.Depends(user_data),
         pagination: Pagination = fastapi.Depends(Pagination),
-) -> SenseListResponse:
-    async with database.transaction() as session:
-        senses_count = await database.get_senses_count(
-            session=session,
-            user=user_session.user,
-        )
+        date_range: DateRange = fastapi.Depends(date_range),
+        emotion_token: bytes | None = fastapi.Depends(emotion_token),
+        full: bool = fastapi.Query(False),
+) -> FastJSONResponse:
+    # Pages carry previews unless the full data is asked for, so a scroll step downloads and
+    # decrypts only what the cards show.
+    try:
         senses_list, previous_cursor, next_cursor = await database.get_senses(
             session=session,
-            user=user_session.user,
+            user_id=user_session.user_id,
             cursor=pagination.cursor,
             limit=pagination.limit,
+            created_from=date_range.created_from,
+            created_to=date_range.created_to,
+            emotion_token=emotion_token,
+            full=full,
+        )
+    except InvalidCursor:
+        raise HTTPInvalidCursor()
+
+    content = {
+        "data": [sense_content(sense) for sense in senses_list],
+        "limit": pagination.limit,
+        "total_items": user_data.senses_count,
+        "previous": previous_cursor,
+        "next": next_cursor,
+    }
+    return FastJSONResponse(content=content, headers=response.headers)
+
+
+async def get_senses_histogram(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        user_data: Row = fastapi.Depends(user_data),
+        date_range: DateRange = fastapi.Depends(date_range),
+) -> SenseHistogramResponse:
+    months = await database.get_senses_histogram(
+        session=session,
+        user_id=user_session.user_id,
+        created_from=date_range.created_from,
+        created_to=date_range.created_to,
+    )
+
+    return SenseHistogramResponse(data=[
+        SenseMonth(month=month, count=count)
+        for month, count in months
+    ])
+
+
+async def get_sense_changes(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        since: int = fastapi.Query(0, ge=0, le=DatabaseService.MAX_VERSION),
+        cursor: str | None = fastapi.Query(None),
+        limit: int = fastapi.Query(100, ge=1, le=1000),
+) -> FastJSONResponse:
+    try:
+        senses, version, next_cursor = await database.get_sense_changes(
+            session=session,
+            user_id=user_session.user_id,
+            since=since,
+            cursor=cursor,
+            limit=limit,
         )
+    except InvalidCursor:
+        raise HTTPInvalidCursor()
+
+    data = [
+        {
+            "id": sense.id,
+            "data": None if sense.deleted_at is not None else encode_base64(sense.data),
+            "preview": encode_optional(sense.preview),
+            "created_at": sense.created_at,
+            "updated_at": sense.updated_at,
+            "deleted": sense.deleted_at is not None,
+            "version": sense.version,
+        }
+        for sense in senses
+    ]
+    return FastJSONResponse(content={"data": data, "version": version, "next": next_cursor})
+
+
+async def sense_events(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        settings: APISettings = fastapi.Depends(settings),
+        user_session: Session = fastapi.Depends(is_auth),
+) -> StreamingResponse:
+    # The stream lives as long as the client stays connected, so it must not keep the request's
+    # connection checked out.
+    await session.close()
+
+    async def events():
+        with database.event_bus.subscribe(user_id=user_session.user_id) as queue:
+            while True:
+                try:
+                    sense_event = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=settings.events_keepalive_interval,
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                data = sense_event.model_dump_json(include={"version", "sense_ids"})
+                yield f"event: {sense_event.type.value}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+async def export_senses(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        cursor: str | None = fastapi.Query(None),
+) -> StreamingResponse:
+    # Every line carries the cursor of its sense, so an interrupted export resumes after the
+    # last received line.
+    if cursor is not None:
+        try:
+            database.cursor_decode(cursor)
+        except InvalidCursor:
+            raise HTTPInvalidCursor()
+    # The stream reads through its own session, so the request's one is released right away.
+    await session.close()
+
+    async def lines():
+        async for rows in database.stream_senses(user_id=user_session.user_id, cursor=cursor):
+            chunk = []
+            for row in rows:
+                cursor_data = CursorData(sense_id=row.id)
+                item = sense_content(row)
+                item["cursor"] = database.cursor_encode(data=cursor_data)
+                chunk.append(dump_json(item) + b"\n")
+            yield b"".join(chunk)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def import_senses(
+        request: fastapi.Request,
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        settings: APISettings = fastapi.Depends(settings),
+        user_session: Session = fastapi.Depends(is_auth),
+) -> SenseImportResponse:
+    # The NDJSON body is consumed as it arrives and every chunk is committed on its own, so
+    # neither memory nor the write lock is held for the whole import.
+    started_at = time.perf_counter()
+    received, imported = 0, 0
+    senses, tail = [], b""
+
+    async def flush():
+        nonlocal imported
+        imported += await database.import_senses(
+            session=session,
+            user_id=user_session.user_id,
+            senses=senses,
+        )
+        await session.commit()
+        senses.clear()
+
+    async def parse(lines: list[bytes]):
+        nonlocal received
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                sense = SenseImportItem.model_validate_json(line)
+            except ValueError:
+                raise HTTPInvalidImport()
+            senses.append(sense.model_dump())
+            received += 1
+            if len(senses) >= settings.senses_import_chunk_size:
+                await flush()
+
+    # On a session cache miss the auth lookup has opened a write transaction, which must not be
+    # held while a slow client uploads the body.
+    await session.commit()
+    async for chunk in request.stream():
+        *lines, tail = (tail + chunk).split(b"\n")
+        await parse(lines)
+    await parse([tail])
+    await flush()
+
+    return SenseImportResponse(
+        received=received,
+        imported=imported,
+        skipped=received - imported,
+        elapsed=time.perf_counter() - started_at,
+    )
+
+
+async def save_new_sense(
+        database: DatabaseService,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        data: bytes,
+        preview: bytes | None = None,
+        emotion_tokens: list[bytes] | None = None,
+) -> Row:
+    if database.batches_senses:
+        # The batch is written through its own connection, which on SQLite is the only writer
+        # connection, so the request gives its connection back first.
+        await session.close()
+        return await database.create_sense_batched(new_sense=NewSense(
+            user_id=user_id,
+            data=data,
+            preview=preview,
+            emotion_tokens=emotion_tokens or [],
+        ))
+
+    sense = await database.create_sense(
+        session=session,
+        user_id=user_id,
+        data=data,
+        preview=preview,
+        emotion_tokens=emotion_tokens,
+    )
+    await session.commit()
+    return sense
+
 
-    return SenseListResponse(
-        data=senses_list,
-        limit=pagination.limit,
-        total_items=senses_count,
-        previous=previous_cursor,
-        next=next_cursor,
+async def save_sense(
+        database: DatabaseService,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        sense_id: uuid.UUID,
+        data: bytes,
+        preview: bytes | None = None,
+        emotion_tokens: list[bytes] | None = None,
+) -> Row:
+    sense = await database.update_sense(
+        session=session,
+        sense_id=sense_id,
+        user_id=user_id,
+        data=data,
+        preview=preview,
+        emotion_tokens=emotion_tokens,
     )
+    if sense is None:
+        owner_id = await database.get_sense_owner(session=session, sense_id=sense_id)
+        raise HTTPNotFound() if owner_id is None else HTTPForbidden()
+    await session.commit()
+
+    return sense
 
 
 async def create_sense(
         database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
         user_session: Session = fastapi.Depends(is_auth),
         data: CreateSenseRequest = fastapi.Body(),
 ) -> SenseResponse:
-    async with database.transaction() as session:
-        sense = await database.create_sense(
-            session=session,
-            user=user_session.user,
-            data=data.data,
-        )
+    sense = await save_new_sense(
+        database=database,
+        session=session,
+        user_id=user_session.user_id,
+        data=data.data,
+        preview=data.preview,
+        emotion_tokens=data.emotion_tokens,
+    )
 
     return SenseResponse.model_validate(sense)
 
 
-async def get_sense(sense: Sense = fastapi.Depends(sense)) -> SenseResponse:
-    return SenseResponse.model_validate(sense)
+async def create_raw_sense(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        data: bytes = fastapi.Body(media_type=RawSenseResponse.media_type),
+        preview: bytes | None = fastapi.Depends(preview),
+        emotion_tokens: list[bytes] | None = fastapi.Depends(emotion_tokens),
+) -> RawSenseResponse:
+    sense = await save_new_sense(
+        database=database,
+        session=session,
+        user_id=user_session.user_id,
+        data=data,
+        preview=preview,
+        emotion_tokens=emotion_tokens,
+    )
+
+    return RawSenseResponse(sense=sense)
+
+
+async def get_sense(
+        response: fastapi.Response,
+        sense: Row = fastapi.Depends(sense),
+) -> FastJSONResponse:
+    return FastJSONResponse(content=sense_content(sense), headers=response.headers)
+
+
+async def get_raw_sense(
+        response: fastapi.Response,
+        sense: Row = fastapi.Depends(sense),
+) -> RawSenseResponse:
+    return RawSenseResponse(sense=sense, headers=response.headers)
 
 
 async def update_sense(
         database: DatabaseService = fastapi.Depends(database),
-        sense: Sense = fastapi.Depends(sense),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        sense_id: uuid.UUID = fastapi.Path(),
         data: UpdateSenseRequest = fastapi.Body(),
 ) -> SenseResponse:
-    async with database.transaction() as session:
-        sense = await database.update_sense(
-            session=session,
-            sense=sense,
-            data=data.data,
-        )
+    sense = await save_sense(
+        database=database,
+        session=session,
+        user_id=user_session.user_id,
+        sense_id=sense_id,
+        data=data.data,
+        preview=data.preview,
+        emotion_tokens=data.emotion_tokens,
+    )
 
     return SenseResponse.model_validate(sense)
 
 
+async def update_raw_sense(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        sense_id: uuid.UUID = fastapi.Path(),
+        data: bytes = fastapi.Body(media_type=RawSenseResponse.media_type),
+        preview: bytes | None = fastapi.Depends(preview),
+        emotion_tokens: list[bytes] | None = fastapi.Depends(emotion_tokens),
+) -> RawSenseResponse:
+    sense = await save_sense(
+        database=database,
+        session=session,
+        user_id=user_session.user_id,
+        sense_id=sense_id,
+        data=data,
+        preview=preview,
+        emotion_tokens=emotion_tokens,
+    )
+
+    return RawSenseResponse(sense=sense)
+
+
 async def delete_sense(
         database: DatabaseService = fastapi.Depends(database),
-        sense: Sense = fastapi.Depends(sense),
+        session: AsyncSession = fastapi.Depends(session),
+        user_session: Session = fastapi.Depends(is_auth),
+        sense_id: uuid.UUID = fastapi.Path(),
 ):
-    async with database.transaction() as session:
-        await database.delete_sense(session=session, sense=sense)
+    deleted = await database.delete_sense(
+        session=session,
+        sense_id=sense_id,
+        user_id=user_session.user_id,
+    )
+    if not deleted:
+        owner_id = await database.get_sense_owner(session=session, sense_id=sense_id)
+        raise HTTPNotFound() if owner_id is None else HTTPForbidden()
+    await session.commit()
+
+
+async def create_senses_batch(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        settings: APISettings = fastapi.Depends(settings),
+        user_session: Session = fastapi.Depends(is_auth),
+        data: BatchCreateSensesRequest = fastapi.Body(),
+) -> SenseBatchResponse:
+    if len(data.data) > settings.senses_batch_max_size:
+        raise HTTPBatchTooLarge()
+
+    senses = await database.create_senses(
+        session=session,
+        items=[
+            NewSense(
+                user_id=user_session.user_id,
+                data=item.data,
+                preview=item.preview,
+                emotion_tokens=item.emotion_tokens,
+            )
+            for item in data.data
+        ],
+    )
+    await session.commit()
+
+    return SenseBatchResponse(data=[
+        SenseBatchItem(
+            id=sense.id,
+            status=BatchItemStatus.OK,
+            sense=SenseResponse.model_validate(sense),
+        )
+        for sense in senses
+    ])
+
+
+async def get_senses_batch(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        settings: APISettings = fastapi.Depends(settings),
+        user_session: Session = fastapi.Depends(is_auth),
+        data: BatchSensesRequest = fastapi.Body(),
+) -> SenseBatchResponse:
+    sense_ids = list(dict.fromkeys(data.ids))
+    if len(sense_ids) > settings.senses_batch_max_size:
+        raise HTTPBatchTooLarge()
+
+    senses = await database.get_senses_by_ids(session=session, sense_ids=sense_ids)
+    senses = {sense.id: sense for sense in senses}
+
+    items = []
+    for sense_id in sense_ids:
+        sense = senses.get(sense_id)
+        if sense is None:
+            items.append(SenseBatchItem(id=sense_id, status=BatchItemStatus.NOT_FOUND))
+        elif sense.user_id != user_session.user_id:
+            items.append(SenseBatchItem(id=sense_id, status=BatchItemStatus.FORBIDDEN))
+        else:
+            items.append(SenseBatchItem(
+                id=sense_id,
+                status=BatchItemStatus.OK,
+                sense=SenseResponse.model_validate(sense),
+            ))
+
+    return SenseBatchResponse(data=items)
+
+
+async def delete_senses_batch(
+        database: DatabaseService = fastapi.Depends(database),
+        session: AsyncSession = fastapi.Depends(session),
+        settings: APISettings = fastapi.Depends(settings),
+        user_session: Session = fastapi.Depends(is_auth),
+        data: BatchSensesRequest = fastapi.Body(),
+) -> SenseBatchResponse:
+    sense_ids = list(dict.fromkeys(data.ids))
+    if len(sense_ids) > settings.senses_batch_max_size:
+        raise HTTPBatchTooLarge()
+
+    deleted_ids = set(await database.delete_senses(
+        session=session,
+        sense_ids=sense_ids,
+        user_id=user_session.user_id,
+    ))
+    owners = {}
+    if len(deleted_ids) < len(sense_ids):
+        owners = await database.get_senses_owners(
+            session=session,
+            sense_ids=[sense_id for sense_id in sense_ids if sense_id not in deleted_ids],
+        )
+    await session.commit()
+
+    items = []
+    for sense_id in sense_ids:
+        if sense_id in deleted_ids:
+            status = BatchItemStatus.OK
+        elif sense_id in owners:
+            status = BatchItemStatus.FORBIDDEN
+        else:
+            status = BatchItemStatus.NOT_FOUND
+        items.append(SenseBatchItem(id=sense_id, status=status))
+
+    return SenseBatchResponse(data=items)
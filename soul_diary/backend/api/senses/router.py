@@ -1,11 +1,38 @@
 import fastapi
 
 from . import handlers
+from .schemas import SenseChangesResponse, SenseListResponse, SenseResponse
 
 router = fastapi.APIRouter()
 
-router.add_api_route(path="/", methods=["GET"], endpoint=handlers.get_sense_list)
+router.add_api_route(
+    path="/",
+    methods=["GET"],
+    endpoint=handlers.get_sense_list,
+    response_model=SenseListResponse,
+)
 router.add_api_route(path="/", methods=["POST"], endpoint=handlers.create_sense)
-router.add_api_route(path="/{sense_id}", methods=["GET"], endpoint=handlers.get_sense)
+router.add_api_route(
+    path="/changes",
+    methods=["GET"],
+    endpoint=handlers.get_sense_changes,
+    response_model=SenseChangesResponse,
+)
+router.add_api_route(path="/histogram", methods=["GET"], endpoint=handlers.get_senses_histogram)
+router.add_api_route(path="/events", methods=["GET"], endpoint=handlers.sense_events)
+router.add_api_route(path="/export", methods=["GET"], endpoint=handlers.export_senses)
+router.add_api_route(path="/import", methods=["POST"], endpoint=handlers.import_senses)
+router.add_api_route(path="/batch", methods=["POST"], endpoint=handlers.create_senses_batch)
+router.add_api_route(path="/batch-get", methods=["POST"], endpoint=handlers.get_senses_batch)
+router.add_api_route(path="/batch-delete", methods=["POST"], endpoint=handlers.delete_senses_batch)
+router.add_api_route(path="/raw", methods=["POST"], endpoint=handlers.create_raw_sense)
+router.add_api_route(
+    path="/{sense_id}",
+    methods=["GET"],
+    endpoint=handlers.get_sense,
+    response_model=SenseResponse,
+)
 router.add_api_route(path="/{sense_id}", methods=["POST"], endpoint=handlers.update_sense)
 router.add_api_route(path="/{sense_id}", methods=["DELETE"], endpoint=handlers.delete_sense)
+router.add_api_route(path="/{sense_id}/raw", methods=["GET"], endpoint=handlers.get_raw_sense)
+router.add_api_route(path="/{sense_id}/raw", methods=["POST"], endpoint=handlers.update_raw_sense)
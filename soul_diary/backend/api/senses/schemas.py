@@ -1,7 +1,54 @@
+import base64
+import enum
 import uuid
-from datetime import datetime
+from datetime import date, datetime, time, timezone
+from typing import Annotated, Any
 
-from pydantic import BaseModel, ConfigDict, NonNegativeInt
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    Field,
+    NonNegativeInt,
+    PlainSerializer,
+    WithJsonSchema,
+    field_validator,
+)
+
+
+def to_utc(value: date | datetime | None) -> datetime | None:
+    # Creation times are stored as naive UTC. A bare date stands for its midnight in UTC.
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        return datetime.combine(value, time())
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def decode_base64(value: Any) -> Any:
+    if isinstance(value, str):
+        return base64.b64decode(value, validate=True)
+    return value
+
+
+def encode_base64(value: bytes) -> str:
+    return base64.b64encode(value).decode("utf-8")
+
+
+# Ciphertexts are stored as bytes and travel as base64 strings in JSON.
+Base64Data = Annotated[
+    bytes,
+    BeforeValidator(decode_base64),
+    PlainSerializer(encode_base64, return_type=str, when_used="json"),
+    WithJsonSchema({"type": "string", "format": "base64"}),
+]
+# Keyed hashes of emotions made by the client, the server only compares them.
+EmotionToken = Annotated[Base64Data, Field(min_length=1, max_length=32)]
+EMOTION_TOKENS_MAX_COUNT = 32
+# A separately encrypted excerpt of the data which list pages show.
+Preview = Annotated[Base64Data, Field(max_length=4096)]
 
 
 class Pagination(BaseModel):
@@ -9,6 +56,11 @@ class Pagination(BaseModel):
     limit: int = 10
 
 
+class DateRange(BaseModel):
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+
 class PaginatedResponse(BaseModel):
     data: list
     limit: int
@@ -18,20 +70,111 @@ class PaginatedResponse(BaseModel):
 
 
 class CreateSenseRequest(BaseModel):
-    data: str
+    data: Base64Data
+    preview: Preview | None = None
+    emotion_tokens: list[EmotionToken] = Field([], max_length=EMOTION_TOKENS_MAX_COUNT)
 
 
 class UpdateSenseRequest(BaseModel):
-    data: str
+    data: Base64Data
+    preview: Preview | None = None
+    # Tokens are kept as they are unless given.
+    emotion_tokens: list[EmotionToken] | None = Field(None, max_length=EMOTION_TOKENS_MAX_COUNT)
 
 
 class SenseResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     id: uuid.UUID
-    data: str
+    data: Base64Data
+    preview: Base64Data | None = None
     created_at: datetime
 
 
+class SenseListItem(BaseModel):
+    id: uuid.UUID
+    # Left out when the preview is enough, unless the full data is asked for.
+    data: Base64Data | None = None
+    preview: Base64Data | None = None
+    created_at: datetime
+
+
+class SenseExportItem(SenseResponse):
+    cursor: str
+
+
+class SenseImportItem(BaseModel):
+    id: uuid.UUID
+    data: Base64Data
+    preview: Preview | None = None
+    created_at: datetime
+
+    @field_validator("created_at")
+    @classmethod
+    def created_at_validator(cls, created_at: datetime) -> datetime:
+        return to_utc(created_at)
+
+
+class SenseImportResponse(BaseModel):
+    received: NonNegativeInt
+    imported: NonNegativeInt
+    skipped: NonNegativeInt
+    elapsed: float
+
+
+class SenseChange(BaseModel):
+    id: uuid.UUID
+    data: Base64Data | None = None
+    preview: Base64Data | None = None
+    created_at: datetime
+    updated_at: datetime
+    deleted: bool
+    version: NonNegativeInt
+
+
+class SenseChangesResponse(BaseModel):
+    data: list[SenseChange]
+    version: NonNegativeInt
+    next: str | None = None
+
+
 class SenseListResponse(PaginatedResponse):
-    data: list[SenseResponse]
+    data: list[SenseListItem]
+    # The count is kept on the user row, so it ignores the date and emotion filters. The
+    # histogram gives counts within a date range.
+    total_items: NonNegativeInt = Field(
+        description="All senses of the user, regardless of the filters.",
+    )
+
+
+class SenseMonth(BaseModel):
+    month: str
+    count: NonNegativeInt
+
+
+class SenseHistogramResponse(BaseModel):
+    data: list[SenseMonth]
+
+
+class BatchCreateSensesRequest(BaseModel):
+    data: list[CreateSenseRequest]
+
+
+class BatchSensesRequest(BaseModel):
+    ids: list[uuid.UUID]
+
+
+class BatchItemStatus(str, enum.Enum):
+    OK = "ok"
+    NOT_FOUND = "not_found"
+    FORBIDDEN = "forbidden"
+
+
+class SenseBatchItem(BaseModel):
+    id: uuid.UUID
+    status: BatchItemStatus
+    sense: SenseResponse | None = None
+
+
+class SenseBatchResponse(BaseModel):
+    data: list[SenseBatchItem]
@@ -4,7 +4,10 @@ from facet import ServiceMixin
 from fastapi.middleware.cors import CORSMiddleware
 
 from soul_diary.backend.database import DatabaseService, get_service as get_database_service
+from soul_diary.backend.database.passwords import PasswordHasher
 from . import router
+from .middlewares import CompressionMiddleware, DatabaseCheckoutsMiddleware
+from .responses import RawSenseResponse
 from .settings import APISettings
 
 
@@ -20,6 +23,12 @@ class APIService(ServiceMixin):
 
         self._port = port
 
+    @property
+    def dependencies(self) -> list[ServiceMixin]:
+        return [
+            self._database,
+        ]
+
     @property
     def database(self) -> DatabaseService:
         return self._database
@@ -36,7 +45,22 @@ class APIService(ServiceMixin):
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=[
+                "ETag",
+                DatabaseCheckoutsMiddleware.HEADER,
+                RawSenseResponse.ID_HEADER,
+                RawSenseResponse.CREATED_AT_HEADER,
+            ],
         )
+        if self._settings.compression_enabled:
+            app.add_middleware(
+                CompressionMiddleware,
+                minimum_size=self._settings.compression_minimum_size,
+                gzip_level=self._settings.compression_gzip_level,
+                brotli_quality=self._settings.compression_brotli_quality,
+            )
+        if self._settings.stats_enabled:
+            app.add_middleware(DatabaseCheckoutsMiddleware, database=self._database)
         app.service = self
         self.setup_app(app=app)
 
@@ -53,8 +77,13 @@ class APIService(ServiceMixin):
 
 
 def get_service() -> APIService:
-    database_service = get_database_service()
     settings = APISettings()
+    password_hasher = PasswordHasher(
+        workers=settings.password_hash_workers,
+        queue_size=settings.password_hash_queue_size,
+        rounds=settings.password_hash_rounds,
+    )
+    database_service = get_database_service(password_hasher=password_hasher)
     return APIService(
         database=database_service,
         settings=settings,
@@ -1,4 +1,4 @@
-from pydantic import conint
+from pydantic import confloat, conint
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,3 +8,16 @@ class APISettings(BaseSettings):
     port: conint(ge=1, le=65535) = 8001
 
     registration_enabled: bool = True
+    stats_enabled: bool = False
+    options_cache_max_age: conint(ge=0) = 300
+    compression_enabled: bool = True
+    compression_minimum_size: conint(ge=0) = 1024
+    compression_gzip_level: conint(ge=1, le=9) = 6
+    compression_brotli_quality: conint(ge=0, le=11) = 4
+    senses_batch_max_size: conint(ge=1) = 100
+    senses_import_chunk_size: conint(ge=1) = 1000
+    events_keepalive_interval: confloat(gt=0) = 15.0
+
+    password_hash_workers: conint(ge=1) = 2
+    password_hash_queue_size: conint(ge=0) = 16
+    password_hash_rounds: conint(ge=4, le=31) = 12
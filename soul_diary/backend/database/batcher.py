@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class WriteBatcher:
+    def __init__(
+            self,
+            flush: Callable[[list[Any]], Awaitable[list[Any]]],
+            max_size: int = 64,
+            max_delay: float = 0.005,
+    ):
+        self._flush = flush
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self._max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self.flush)
+
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]):
+        # The batch is written in one transaction, so a failing item fails the whole batch.
+        try:
+            results = await self._flush([item for item, _ in batch])
+        except Exception as exception:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
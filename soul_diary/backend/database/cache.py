@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+
+
+# Every API replica keeps its own in-process cache. An invalidator backed by a shared channel
+# (Postgres LISTEN/NOTIFY, Redis pub/sub, ...) delivers invalidated keys to all of them.
+class BaseCacheInvalidator:
+    def __init__(self):
+        self._callbacks: list[Callable[[str], None]] = []
+
+    def subscribe(self, callback: Callable[[str], None]):
+        self._callbacks.append(callback)
+
+    async def publish(self, key: str):
+        raise NotImplementedError
+
+
+class InMemoryCacheInvalidator(BaseCacheInvalidator):
+    async def publish(self, key: str):
+        for callback in self._callbacks:
+            callback(key)
+
+
+class TTLCache:
+    def __init__(
+            self,
+            max_size: int = 1024,
+            ttl: float = 60.0,
+            invalidator: BaseCacheInvalidator | None = None,
+    ):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._invalidator = invalidator or InMemoryCacheInvalidator()
+        self._invalidator.subscribe(self.discard)
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any | None:
+        item = self._items.get(key)
+        if item is not None and item[0] <= time.monotonic():
+            del self._items[key]
+            item = None
+
+        if item is None:
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: str, value: Any):
+        if self._max_size <= 0:
+            return
+
+        self._items[key] = (time.monotonic() + self._ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+    def discard(self, key: str):
+        self._items.pop(key, None)
+
+    async def invalidate(self, key: str):
+        self.discard(key)
+        await self._invalidator.publish(key)
+
+    def get_stats(self) -> CacheStats:
+        return CacheStats(
+            size=len(self._items),
+            max_size=self._max_size,
+            hits=self.hits,
+            misses=self.misses,
+        )
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Optional
 
 import typer
@@ -42,6 +43,48 @@ def migrations_create(
     database_service.create_migration(message=message)
 
 
+def explain(ctx: typer.Context):
+    database_service: DatabaseService = ctx.obj["database"]
+
+    async def explain_hot_queries():
+        async with database_service:
+            return await database_service.explain_hot_queries()
+
+    plans = asyncio.run(explain_hot_queries())
+    all_use_index = True
+    for name, (plan, uses_index) in plans.items():
+        typer.echo(f"{name}: {'OK' if uses_index else 'NOT INDEXED'}")
+        for line in plan:
+            typer.echo(f"    {line}")
+        all_use_index = all_use_index and uses_index
+
+    if not all_use_index:
+        raise typer.Exit(code=1)
+
+
+def senses_count(
+        ctx: typer.Context,
+        repair: bool = typer.Option(
+            False,
+            "--repair",
+            help="Overwrite wrong counters with the actual number of senses",
+        ),
+):
+    database_service: DatabaseService = ctx.obj["database"]
+
+    async def check_senses_count():
+        async with database_service:
+            async with database_service.transaction() as session:
+                return await database_service.check_senses_count(session=session, repair=repair)
+
+    mismatches = asyncio.run(check_senses_count())
+    for user_id, stored_count, actual_count in mismatches:
+        typer.echo(f"{user_id}: stored {stored_count}, actual {actual_count}")
+
+    if mismatches and not repair:
+        raise typer.Exit(code=1)
+
+
 def get_migrations_cli() -> typer.Typer:
     cli = typer.Typer(name="Migration")
 
@@ -63,5 +106,7 @@ def get_cli() -> typer.Typer:
 
     cli.callback()(service_callback)
     cli.add_typer(get_migrations_cli(), name="migrations")
+    cli.command(name="explain")(explain)
+    cli.command(name="senses-count")(senses_count)
 
     return cli
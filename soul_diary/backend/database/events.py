@@ -0,0 +1,63 @@
+import asyncio
+import enum
+import uuid
+from contextlib import contextmanager
+
+from pydantic import BaseModel
+
+
+class SenseEventType(str, enum.Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    # Sent instead of the events a slow subscriber couldn't take, the subscriber has to reload.
+    RESYNC = "resync"
+
+
+class SenseEvent(BaseModel):
+    type: SenseEventType
+    user_id: uuid.UUID
+    version: int
+    sense_ids: list[uuid.UUID] = []
+
+
+# Every API replica delivers events to its own subscribers. A bus backed by a shared channel
+# (Postgres LISTEN/NOTIFY, Redis pub/sub, ...) publishes there and delivers what it receives.
+class BaseEventBus:
+    def __init__(self, queue_size: int = 256):
+        self._queue_size = queue_size
+        self._subscribers: dict[uuid.UUID, set[asyncio.Queue]] = {}
+
+    @contextmanager
+    def subscribe(self, user_id: uuid.UUID):
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers[user_id]
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def deliver(self, event: SenseEvent):
+        for queue in self._subscribers.get(event.user_id, ()):
+            if not queue.full():
+                queue.put_nowait(event)
+                continue
+
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(SenseEvent(
+                type=SenseEventType.RESYNC,
+                user_id=event.user_id,
+                version=event.version,
+            ))
+
+    async def publish(self, event: SenseEvent):
+        raise NotImplementedError
+
+
+class InMemoryEventBus(BaseEventBus):
+    async def publish(self, event: SenseEvent):
+        self.deliver(event)
@@ -0,0 +1,10 @@
+class DatabaseException(Exception):
+    pass
+
+
+class PasswordHasherOverloaded(DatabaseException):
+    pass
+
+
+class InvalidCursor(DatabaseException):
+    pass
@@ -0,0 +1,15 @@
+import secrets
+import time
+import uuid
+
+
+def uuid7() -> uuid.UUID:
+    # UUIDv7 (RFC 9562): 48 bits of Unix time in milliseconds, 12 bits of sub-millisecond
+    # fraction, 62 random bits. Ids of consecutive inserts are close in every btree.
+    milliseconds, nanoseconds = divmod(time.time_ns(), 1_000_000)
+    fraction = nanoseconds * 4096 // 1_000_000
+
+    value = (milliseconds & (1 << 48) - 1) << 80
+    value |= 0x7 << 76 | fraction << 64
+    value |= 0b10 << 62 | secrets.randbits(62)
+    return uuid.UUID(int=value)
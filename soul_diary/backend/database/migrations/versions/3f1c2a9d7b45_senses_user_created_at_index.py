@@ -0,0 +1,46 @@
+"""senses user created_at index
+
+Revision ID: 3f1c2a9d7b45
+Revises: ed569caafd85
+Create Date: 2026-10-17 10:12:43.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a9d7b45"
+down_revision: Union[str, None] = "ed569caafd85"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index("senses__created_at__id_idx", table_name="senses", postgresql_using="btree")
+    op.drop_index("senses__user_id_idx", table_name="senses", postgresql_using="hash")
+    op.drop_index("senses__id_idx", table_name="senses", postgresql_using="hash")
+    op.drop_index("sessions__token_idx", table_name="sessions", postgresql_using="hash")
+    op.drop_index("users__id_idx", table_name="users", postgresql_using="hash")
+    op.create_index(
+        "senses__user_id__created_at__id_idx",
+        "senses",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        postgresql_using="btree",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("senses__user_id__created_at__id_idx", table_name="senses",
+                  postgresql_using="btree")
+    op.create_index("users__id_idx", "users", ["id"], unique=False, postgresql_using="hash")
+    op.create_index("sessions__token_idx", "sessions", ["token"], unique=False,
+                    postgresql_using="hash")
+    op.create_index("senses__id_idx", "senses", ["id"], unique=False, postgresql_using="hash")
+    op.create_index("senses__user_id_idx", "senses", ["user_id"], unique=False,
+                    postgresql_using="hash")
+    op.create_index("senses__created_at__id_idx", "senses", ["created_at", "id"], unique=False,
+                    postgresql_using="btree")
@@ -0,0 +1,68 @@
+"""senses versions and tombstones
+
+Revision ID: 4b9e2d7f1a36
+Revises: c27e51b9a6f0
+Create Date: 2026-10-17 20:12:37.418906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4b9e2d7f1a36"
+down_revision: Union[str, None] = "c27e51b9a6f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("data_version", sa.Integer(), server_default="0", nullable=False),
+    )
+    # A constant default lets SQLite add the NOT NULL column without rebuilding the table.
+    op.add_column(
+        "senses",
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default="1970-01-01 00:00:00",
+            nullable=False,
+        ),
+    )
+    op.add_column("senses", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+    op.add_column(
+        "senses",
+        sa.Column("version", sa.Integer(), server_default="0", nullable=False),
+    )
+    # Existing senses become the first version, so a sync from version 0 returns all of them.
+    op.execute("UPDATE senses SET updated_at = created_at, version = 1")
+    op.execute("UPDATE users SET data_version = 1")
+    op.create_index("senses__user_id__version__id_idx", "senses", ["user_id", "version", "id"],
+                    unique=False, postgresql_using="btree")
+
+
+def downgrade() -> None:
+    # Tombstones have no data left, so they are dropped together with the columns.
+    op.execute("DELETE FROM senses WHERE deleted_at IS NOT NULL")
+    op.drop_index("senses__user_id__version__id_idx", table_name="senses",
+                  postgresql_using="btree")
+    op.drop_index("senses__user_id__created_at__id_idx", table_name="senses",
+                  postgresql_using="btree")
+    with op.batch_alter_table("senses") as batch_op:
+        batch_op.drop_column("version")
+        batch_op.drop_column("deleted_at")
+        batch_op.drop_column("updated_at")
+    # The batch rebuild on SQLite would recreate the index without its sort order.
+    op.create_index(
+        "senses__user_id__created_at__id_idx",
+        "senses",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        postgresql_using="btree",
+    )
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("data_version")
@@ -0,0 +1,39 @@
+"""senses preview
+
+Revision ID: 5e8a2c4f9d61
+Revises: 9c7f3b1e5a28
+Create Date: 2026-10-18 15:32:18.447093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8a2c4f9d61"
+down_revision: Union[str, None] = "9c7f3b1e5a28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("senses", sa.Column("preview", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_index("senses__user_id__created_at__id_idx", table_name="senses",
+                  postgresql_using="btree")
+    with op.batch_alter_table("senses") as batch_op:
+        batch_op.drop_column("preview")
+    # The batch rebuild on SQLite would recreate the index without its sort order.
+    op.create_index(
+        "senses__user_id__created_at__id_idx",
+        "senses",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        postgresql_using="btree",
+        postgresql_where=sa.text("deleted_at IS NULL"),
+        sqlite_where=sa.text("deleted_at IS NULL"),
+    )
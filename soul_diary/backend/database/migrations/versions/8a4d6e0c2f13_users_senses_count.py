@@ -0,0 +1,34 @@
+"""users senses count
+
+Revision ID: 8a4d6e0c2f13
+Revises: 3f1c2a9d7b45
+Create Date: 2026-10-17 11:40:05.731492
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8a4d6e0c2f13"
+down_revision: Union[str, None] = "3f1c2a9d7b45"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("senses_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        "UPDATE users SET senses_count = "
+        "(SELECT count(senses.id) FROM senses WHERE senses.user_id = users.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("senses_count")
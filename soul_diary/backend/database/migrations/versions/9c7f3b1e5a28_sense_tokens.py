@@ -0,0 +1,44 @@
+"""sense tokens
+
+Revision ID: 9c7f3b1e5a28
+Revises: e3a5c9d1f7b2
+Create Date: 2026-10-18 12:04:37.861920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c7f3b1e5a28"
+down_revision: Union[str, None] = "e3a5c9d1f7b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sense_tokens",
+        sa.Column("sense_id", sa.Uuid(), nullable=False),
+        sa.Column("token", sa.LargeBinary(length=32), nullable=False),
+        sa.Column("user_id", sa.Uuid(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["sense_id"], ["senses.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("sense_id", "token"),
+    )
+    op.create_index(
+        "sense_tokens__user_id__token__created_at__sense_id_idx",
+        "sense_tokens",
+        ["user_id", "token", sa.text("created_at DESC"), sa.text("sense_id DESC")],
+        unique=False,
+        postgresql_using="btree",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("sense_tokens__user_id__token__created_at__sense_id_idx",
+                  table_name="sense_tokens", postgresql_using="btree")
+    op.drop_table("sense_tokens")
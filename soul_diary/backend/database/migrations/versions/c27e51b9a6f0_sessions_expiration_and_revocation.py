@@ -0,0 +1,32 @@
+"""sessions expiration and revocation
+
+Revision ID: c27e51b9a6f0
+Revises: 8a4d6e0c2f13
+Create Date: 2026-10-17 13:02:51.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c27e51b9a6f0"
+down_revision: Union[str, None] = "8a4d6e0c2f13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("sessions", sa.Column("expires_at", sa.DateTime(), nullable=True))
+    op.add_column("sessions", sa.Column("revoked_at", sa.DateTime(), nullable=True))
+    op.create_index("sessions__revoked_at_idx", "sessions", ["revoked_at"], unique=False,
+                    postgresql_using="btree")
+
+
+def downgrade() -> None:
+    op.drop_index("sessions__revoked_at_idx", table_name="sessions", postgresql_using="btree")
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.drop_column("revoked_at")
+        batch_op.drop_column("expires_at")
@@ -0,0 +1,84 @@
+"""senses binary data
+
+Revision ID: d61f0b8e2a74
+Revises: 4b9e2d7f1a36
+Create Date: 2026-10-17 22:41:09.530172
+
+"""
+import base64
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d61f0b8e2a74"
+down_revision: Union[str, None] = "4b9e2d7f1a36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK_SIZE = 1000
+
+
+def copy_data(data_type: sa.types.TypeEngine, new_data_type: sa.types.TypeEngine, convert):
+    # SQLite has no base64 functions, so rows are converted here chunk by chunk.
+    connection = op.get_bind()
+    senses = sa.table(
+        "senses",
+        sa.column("id", sa.Uuid()),
+        sa.column("data", data_type),
+        sa.column("new_data", new_data_type),
+    )
+    query = (
+        sa.select(senses.c.id, senses.c.data)
+        .where(senses.c.new_data.is_(None))
+        .limit(CHUNK_SIZE)
+    )
+    update = (
+        senses.update().where(senses.c.id == sa.bindparam("sense_id"))
+        .values(new_data=sa.bindparam("value"))
+    )
+
+    while rows := connection.execute(query).all():
+        connection.execute(
+            update,
+            [{"sense_id": sense_id, "value": convert(data)} for sense_id, data in rows],
+        )
+
+
+def replace_data_column(new_type: sa.types.TypeEngine):
+    op.drop_index("senses__user_id__created_at__id_idx", table_name="senses",
+                  postgresql_using="btree")
+    with op.batch_alter_table("senses") as batch_op:
+        batch_op.drop_column("data")
+        batch_op.alter_column("new_data", new_column_name="data", existing_type=new_type,
+                              nullable=False)
+    # The batch rebuild on SQLite would recreate the index without its sort order.
+    op.create_index(
+        "senses__user_id__created_at__id_idx",
+        "senses",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        postgresql_using="btree",
+    )
+
+
+def upgrade() -> None:
+    op.add_column("senses", sa.Column("new_data", sa.LargeBinary(), nullable=True))
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("UPDATE senses SET new_data = decode(data, 'base64')")
+    else:
+        copy_data(data_type=sa.String(), new_data_type=sa.LargeBinary(),
+                  convert=base64.b64decode)
+    replace_data_column(new_type=sa.LargeBinary())
+
+
+def downgrade() -> None:
+    op.add_column("senses", sa.Column("new_data", sa.String(), nullable=True))
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(r"UPDATE senses SET new_data = translate(encode(data, 'base64'), E'\n', '')")
+    else:
+        copy_data(data_type=sa.LargeBinary(), new_data_type=sa.String(),
+                  convert=lambda data: base64.b64encode(data).decode("utf-8"))
+    replace_data_column(new_type=sa.String())
@@ -0,0 +1,44 @@
+"""senses live created_at index
+
+Revision ID: e3a5c9d1f7b2
+Revises: d61f0b8e2a74
+Create Date: 2026-10-18 09:26:51.207415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e3a5c9d1f7b2"
+down_revision: Union[str, None] = "d61f0b8e2a74"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def create_created_at_index(where: sa.TextClause | None = None):
+    op.create_index(
+        "senses__user_id__created_at__id_idx",
+        "senses",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        postgresql_using="btree",
+        postgresql_where=where,
+        sqlite_where=where,
+    )
+
+
+def upgrade() -> None:
+    # Tombstones are left out of the index, so list pages and month counts are read from the
+    # index alone.
+    op.drop_index("senses__user_id__created_at__id_idx", table_name="senses",
+                  postgresql_using="btree")
+    create_created_at_index(where=sa.text("deleted_at IS NULL"))
+
+
+def downgrade() -> None:
+    op.drop_index("senses__user_id__created_at__id_idx", table_name="senses",
+                  postgresql_using="btree")
+    create_created_at_index()
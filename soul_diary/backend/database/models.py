@@ -3,7 +3,7 @@ import string
 import uuid
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Index, String
+from sqlalchemy import ForeignKey, Index, LargeBinary, String, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -17,12 +17,13 @@ class User(Base):
     id: Mapped[uuid.UUID] = mapped_column(default=uuid.uuid4, primary_key=True)
     username: Mapped[str] = mapped_column(String(64), unique=True)
     password: Mapped[str] = mapped_column(String(72))
+    senses_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    data_version: Mapped[int] = mapped_column(default=0, server_default="0")
 
     senses: Mapped[list["Sense"]] = relationship(back_populates="user")
     sessions: Mapped[list["Session"]] = relationship(back_populates="user")
 
     __table_args__ = (
-        Index("users__id_idx", "id", postgresql_using="hash"),
         Index("users__username_idx", "username", postgresql_using="hash"),
     )
 
@@ -35,12 +36,14 @@ class Session(Base):
         default=lambda: "".join(random.choice(string.hexdigits) for _ in range(32)),
     )
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
+    expires_at: Mapped[datetime | None]
+    revoked_at: Mapped[datetime | None]
 
-    user: Mapped[User] = relationship(back_populates="sessions", lazy=False)
+    user: Mapped[User] = relationship(back_populates="sessions")
 
     __table_args__ = (
-        Index("sessions__token_idx", "token", postgresql_using="hash"),
         Index("sessions__user_id_idx", "user_id", postgresql_using="hash"),
+        Index("sessions__revoked_at_idx", "revoked_at", postgresql_using="btree"),
     )
 
 
@@ -49,13 +52,46 @@ class Sense(Base):
 
     id: Mapped[uuid.UUID] = mapped_column(default=uuid.uuid4, primary_key=True)
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
-    data: Mapped[str]
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    # A separately encrypted part of the data, enough for list pages.
+    preview: Mapped[bytes | None] = mapped_column(LargeBinary)
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    deleted_at: Mapped[datetime | None]
+    version: Mapped[int] = mapped_column(default=0, server_default="0")
 
-    user: Mapped[User] = relationship(back_populates="senses", lazy=False)
+    user: Mapped[User] = relationship(back_populates="senses")
 
     __table_args__ = (
-        Index("senses__id_idx", "id", postgresql_using="hash"),
-        Index("senses__user_id_idx", "user_id", postgresql_using="hash"),
-        Index("senses__created_at__id_idx", "created_at", "id", postgresql_using="btree"),
+        Index(
+            "senses__user_id__created_at__id_idx",
+            "user_id", text("created_at DESC"), text("id DESC"),
+            postgresql_using="btree",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "senses__user_id__version__id_idx",
+            "user_id", "version", "id",
+            postgresql_using="btree",
+        ),
+    )
+
+
+class SenseToken(Base):
+    __tablename__ = "sense_tokens"
+
+    sense_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("senses.id"), primary_key=True)
+    token: Mapped[bytes] = mapped_column(LargeBinary(32), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
+    # A copy of the sense's creation time, so the senses matching a token are paged from this
+    # table's index alone.
+    created_at: Mapped[datetime]
+
+    __table_args__ = (
+        Index(
+            "sense_tokens__user_id__token__created_at__sense_id_idx",
+            "user_id", "token", text("created_at DESC"), text("sense_id DESC"),
+            postgresql_using="btree",
+        ),
     )
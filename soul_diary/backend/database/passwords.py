@@ -0,0 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from .exceptions import PasswordHasherOverloaded
+
+
+class PasswordHasher:
+    ENCODING = "utf-8"
+
+    def __init__(self, workers: int = 2, queue_size: int = 16, rounds: int = 12):
+        self._workers = workers
+        self._rounds = rounds
+        self._slots = asyncio.Semaphore(workers + queue_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="password-hasher",
+        )
+
+    async def run(self, function, *args):
+        # Admission control: a login storm is answered right away instead of queueing forever.
+        if self._slots.locked():
+            raise PasswordHasherOverloaded()
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, function, *args)
+
+    async def hash(self, password: str) -> str:
+        hashed_password = await self.run(
+            bcrypt.hashpw,
+            password.encode(self.ENCODING),
+            bcrypt.gensalt(rounds=self._rounds),
+        )
+        return hashed_password.decode(self.ENCODING)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(
+            bcrypt.checkpw,
+            password.encode(self.ENCODING),
+            hashed_password.encode(self.ENCODING),
+        )
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        # bcrypt hashes look like "$2b$<rounds>$<salt and hash>"
+        return int(hashed_password.split("$")[2]) != self._rounds
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,45 @@
+import time
+
+from pydantic import BaseModel
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolStats(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    wait_time: float
+    max_wait_time: float
+
+
+class StatsPool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _do_get(self):
+        # Includes the connect time when the pool has to open a new connection.
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait_time = time.perf_counter() - started_at
+            self.checkouts += 1
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def get_stats(self) -> PoolStats:
+        return PoolStats(
+            size=self.size(),
+            checked_in=self.checkedin(),
+            checked_out=self.checkedout(),
+            overflow=max(self.overflow(), 0),
+            checkouts=self.checkouts,
+            wait_time=self.wait_time,
+            max_wait_time=self.max_wait_time,
+        )
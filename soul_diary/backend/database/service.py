@@ -1,36 +1,211 @@
+import asyncio
 import base64
+import binascii
 import pathlib
+import re
 import struct
 import uuid
-from contextlib import asynccontextmanager
-from datetime import datetime
-from typing import Type
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Type
 
-import bcrypt
 from alembic import command as alembic_command
 from alembic.config import Config as AlembicConfig
 from facet import ServiceMixin
 from pydantic import BaseModel
-from sqlalchemy import and_, func, or_, select
+from sqlalchemy import (
+    Row,
+    bindparam,
+    case,
+    delete,
+    event,
+    false,
+    func,
+    insert,
+    select,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import orm
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.expression import Executable
 
-from .models import Sense, Session, User
+from .batcher import WriteBatcher
+from .cache import CacheStats, TTLCache
+from .events import BaseEventBus, InMemoryEventBus, SenseEvent, SenseEventType
+from .exceptions import InvalidCursor, PasswordHasherOverloaded
+from .ids import uuid7
+from .models import Sense, SenseToken, Session, User
+from .passwords import PasswordHasher
+from .pool import PoolStats, StatsPool
 from .settings import DatabaseSettings
+from .tokens import TokenData, TokenSigner
 
 
 class CursorData(BaseModel):
-    created_at: datetime
     sense_id: uuid.UUID
+    # Only cursors issued before they held the id alone carry the creation time.
+    created_at: datetime | None = None
+
+
+class NewSense(BaseModel):
+    user_id: uuid.UUID
+    data: bytes
+    preview: bytes | None = None
+    emotion_tokens: list[bytes] = []
+
+
+class ChangesCursorData(BaseModel):
+    version: int
+    sense_id: uuid.UUID
+
+
+class DatabaseStats(BaseModel):
+    session_cache: CacheStats
+    pool: PoolStats
+    write_pool: PoolStats | None = None
+
+
+class CheckoutCounter:
+    def __init__(self):
+        self.count = 0
+
+
+class DatabaseSession(orm.Session):
+    pass
+
+
+@event.listens_for(DatabaseSession, "after_commit")
+def publish_sense_events(session: DatabaseSession):
+    sense_events = session.info.pop("sense_events", None)
+    if sense_events:
+        session.info["database"].publish_sense_events(sense_events)
+
+
+@event.listens_for(DatabaseSession, "after_rollback")
+def discard_sense_events(session: DatabaseSession):
+    session.info.pop("sense_events", None)
 
 
 class DatabaseService(ServiceMixin):
     ENCODING = "utf-8"
+    FULL_SCAN_PATTERNS = {
+        "sqlite": re.compile(r"\bSCAN (senses|sense_tokens|sessions|users)\b"),
+        "postgresql": re.compile(r"\bSeq Scan on (senses|sense_tokens|sessions|users)\b"),
+    }
+    # A sort beside a table read in one step of a SQLite plan orders every row the read finds
+    # before the limit applies, instead of reading them in the order of an index.
+    SQLITE_TABLE_READ_PATTERN = re.compile(r"^(SCAN|SEARCH) (senses|sense_tokens|sessions|users)\b")
+    SQLITE_FULL_SORT = "USE TEMP B-TREE FOR ORDER BY"
+    INSERTS = {
+        "sqlite": sqlite.insert,
+        "postgresql": postgresql.insert,
+    }
+    # Versions are INTEGER columns, which Postgres keeps in 32 bits.
+    MAX_VERSION = 2 ** 31 - 1
+    MONTHS = {
+        # SQLite keeps datetimes as ISO strings, so the month is their "YYYY-MM" prefix.
+        "sqlite": lambda column: func.substr(column, 1, 7),
+        "postgresql": lambda column: func.to_char(column, "YYYY-MM"),
+    }
 
-    def __init__(self, dsn: str):
+    def __init__(
+            self,
+            dsn: str,
+            session_cache: TTLCache | None = None,
+            event_bus: BaseEventBus | None = None,
+            password_hasher: PasswordHasher | None = None,
+            token_signer: TokenSigner | None = None,
+            token_ttl: timedelta = timedelta(days=30),
+            revoked_sessions_refresh_interval: float = 30.0,
+            pool_size: int = 5,
+            pool_min_size: int = 1,
+            pool_max_overflow: int = 10,
+            pool_timeout: float = 30.0,
+            pool_recycle: int = 3600,
+            pool_pre_ping: bool = True,
+            sqlite_busy_timeout: int = 5000,
+            sqlite_mmap_size: int = 256 * 1024 * 1024,
+            sense_batch_enabled: bool = False,
+            sense_batch_max_size: int = 64,
+            sense_batch_max_delay: float = 0.005,
+            sense_id_uuid7: bool = False,
+    ):
         self._dsn = dsn
-        self._engine = create_async_engine(self._dsn, pool_recycle=60)
-        self._sessionmaker = async_sessionmaker(self._engine, expire_on_commit=False)
+        pool_options = {
+            "poolclass": StatsPool,
+            "pool_timeout": pool_timeout,
+            "pool_recycle": pool_recycle,
+            "pool_pre_ping": pool_pre_ping,
+        }
+        self._engine = create_async_engine(
+            self._dsn,
+            pool_size=pool_size,
+            max_overflow=pool_max_overflow,
+            **pool_options,
+        )
+        self._write_engine = self._engine
+        read_only_engine = self._engine
+        if self._engine.dialect.name == "postgresql":
+            read_only_engine = self._engine.execution_options(postgresql_readonly=True)
+        if self._engine.dialect.name == "sqlite":
+            # SQLite allows a single writer at a time. Writes queue up for the only connection of
+            # the writer pool instead of failing with "database is locked", while WAL lets
+            # the reader pool proceed concurrently.
+            self._write_engine = create_async_engine(
+                self._dsn,
+                pool_size=1,
+                max_overflow=0,
+                **pool_options,
+            )
+            self._sqlite_pragmas = {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "busy_timeout": sqlite_busy_timeout,
+                "mmap_size": sqlite_mmap_size,
+            }
+            for engine, begin in ((self._engine, "BEGIN"), (self._write_engine, "BEGIN IMMEDIATE")):
+                event.listen(engine.sync_engine, "connect", self._on_sqlite_connect)
+                event.listen(
+                    engine.sync_engine,
+                    "begin",
+                    lambda connection, begin=begin: connection.exec_driver_sql(begin),
+                )
+        self._pool_min_size = min(pool_min_size, pool_size)
+        session_options = {
+            "expire_on_commit": False,
+            "sync_session_class": DatabaseSession,
+            "info": {"database": self},
+        }
+        self._sessionmaker = async_sessionmaker(self._write_engine, **session_options)
+        self._read_only_sessionmaker = async_sessionmaker(read_only_engine, **session_options)
+        self._checkout_counter: ContextVar[CheckoutCounter | None] = ContextVar(
+            "checkout_counter", default=None,
+        )
+        for engine in {self._engine, self._write_engine}:
+            event.listen(engine.sync_engine.pool, "checkout", self._on_checkout)
+        self._session_cache = session_cache or TTLCache()
+        self._event_bus = event_bus or InMemoryEventBus()
+        self._publish_tasks: set[asyncio.Task] = set()
+        self._password_hasher = password_hasher or PasswordHasher()
+        self._token_signer = token_signer
+        self._token_ttl = token_ttl
+        self._revoked_sessions_refresh_interval = revoked_sessions_refresh_interval
+        self._revoked_sessions: set[str] = set()
+        self._sense_id_factory = uuid7 if sense_id_uuid7 else uuid.uuid4
+        self._sense_batcher = None
+        if sense_batch_enabled:
+            self._sense_batcher = WriteBatcher(
+                flush=self.insert_senses,
+                max_size=sense_batch_max_size,
+                max_delay=sense_batch_max_delay,
+            )
 
     def get_alembic_config(self) -> AlembicConfig:
         migrations_path = pathlib.Path(__file__).parent / "migrations"
@@ -42,14 +217,101 @@ class DatabaseService(ServiceMixin):
         return config
 
     def get_models(self) -> list[Type[DeclarativeBase]]:
-        return [User, Sense]
+        return [User, Sense, SenseToken]
+
+    async def start(self):
+        await self.warm_up_pool()
+        if self._token_signer is not None:
+            await self.refresh_revoked_sessions()
+            self.add_task(self.refresh_revoked_sessions_periodically())
+
+    async def stop(self):
+        if self._sense_batcher is not None:
+            await self._sense_batcher.close()
+        self._password_hasher.shutdown()
+        await self._engine.dispose()
+        if self._write_engine is not self._engine:
+            await self._write_engine.dispose()
+
+    async def warm_up_pool(self):
+        # Connections are opened at once and returned to the pool, so the first requests
+        # don't pay the connect latency.
+        connections = await asyncio.gather(
+            *(self._engine.connect() for _ in range(self._pool_min_size)),
+        )
+        if self._write_engine is not self._engine and self._pool_min_size > 0:
+            connections.append(await self._write_engine.connect())
+        for connection in connections:
+            await connection.close()
+
+    def get_stats(self) -> DatabaseStats:
+        write_pool = None
+        if self._write_engine is not self._engine:
+            write_pool = self._write_engine.sync_engine.pool.get_stats()
+
+        return DatabaseStats(
+            session_cache=self._session_cache.get_stats(),
+            pool=self._engine.sync_engine.pool.get_stats(),
+            write_pool=write_pool,
+        )
+
+    @property
+    def event_bus(self) -> BaseEventBus:
+        return self._event_bus
+
+    def add_sense_event(
+            self,
+            session: AsyncSession,
+            type: SenseEventType,
+            user_id: uuid.UUID,
+            version: int,
+            sense_ids: list[uuid.UUID],
+    ):
+        # Events are published once the session commits and dropped if it rolls back.
+        sense_event = SenseEvent(type=type, user_id=user_id, version=version, sense_ids=sense_ids)
+        session.info.setdefault("sense_events", []).append(sense_event)
+
+    def publish_sense_events(self, sense_events: list[SenseEvent]):
+        for sense_event in sense_events:
+            task = asyncio.create_task(self._event_bus.publish(sense_event))
+            self._publish_tasks.add(task)
+            task.add_done_callback(self._publish_tasks.discard)
 
     @asynccontextmanager
-    async def transaction(self):
-        async with self._sessionmaker() as session:
+    async def session(self, read_only: bool = False):
+        # Nothing is committed implicitly, closing the session rolls back what is left.
+        sessionmaker = self._read_only_sessionmaker if read_only else self._sessionmaker
+        async with sessionmaker() as session:
+            yield session
+
+    @asynccontextmanager
+    async def transaction(self, read_only: bool = False):
+        async with self.session(read_only=read_only) as session:
             async with session.begin():
                 yield session
 
+    def _on_sqlite_connect(self, dbapi_connection, connection_record):
+        # Transactions are started by the "begin" listeners, so the driver must not start its own.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in self._sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        counter = self._checkout_counter.get()
+        if counter is not None:
+            counter.count += 1
+
+    @contextmanager
+    def count_checkouts(self):
+        counter = CheckoutCounter()
+        token = self._checkout_counter.set(counter)
+        try:
+            yield counter
+        finally:
+            self._checkout_counter.reset(token)
+
     def migrate(self):
         alembic_command.upgrade(self.get_alembic_config(), "head")
 
@@ -67,12 +329,9 @@ class DatabaseService(ServiceMixin):
         )
 
     async def create_user(self, session: AsyncSession, username: str, password: str) -> User:
-        hashed_password = bcrypt.hashpw(
-            password.encode("utf-8"),
-            bcrypt.gensalt(),
-        ).decode("utf-8")
+        hashed_password = await self._password_hasher.hash(password)
         user = User(username=username, password=hashed_password)
-        user_session = Session(user=user)
+        user_session = self.new_user_session(user=user)
         user.sessions.append(user_session)
 
         session.add_all([user, user_session])
@@ -89,132 +348,954 @@ class DatabaseService(ServiceMixin):
 
         result = await session.execute(query)
         user = result.scalar_one_or_none()
+        # Hashing takes a while, so the connection is handed back to the pool meanwhile. On
+        # SQLite it is the only writer connection.
+        await session.commit()
         if user is None:
             return None
-        if not bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
+        if not await self._password_hasher.verify(password, user.password):
             return None
+        if self._password_hasher.needs_rehash(user.password):
+            # The rehash is best-effort, an overloaded hasher mustn't fail a verified login.
+            try:
+                user.password = await self._password_hasher.hash(password)
+            except PasswordHasherOverloaded:
+                pass
 
-        user_session = Session(user=user)
+        user_session = self.new_user_session(user=user)
         session.add(user_session)
 
         return user_session
 
+    def new_user_session(self, user: User) -> Session:
+        expires_at = None
+        if self._token_signer is not None:
+            expires_at = datetime.utcnow() + self._token_ttl
+
+        return Session(user=user, expires_at=expires_at)
+
+    def get_token(self, user_session: Session) -> str:
+        if self._token_signer is None or user_session.expires_at is None:
+            return user_session.token
+
+        token_data = TokenData(
+            user_id=user_session.user_id,
+            session_id=user_session.token,
+            expires_at=user_session.expires_at,
+        )
+        return self._token_signer.sign(data=token_data)
+
     async def logout_user(self, session: AsyncSession, user_session: Session):
-        await session.delete(user_session)
+        if user_session.expires_at is None:
+            query = delete(Session).where(Session.token == user_session.token)
+        else:
+            # Signed tokens stay valid until they expire, so the session is kept as a revocation
+            # record which every replica picks up on the next refresh.
+            query = (
+                update(Session).where(Session.token == user_session.token)
+                .values(revoked_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            self._revoked_sessions.add(user_session.token)
+
+        await session.execute(query)
+        await self._session_cache.invalidate(user_session.token)
+
+    async def refresh_revoked_sessions(self):
+        now = datetime.utcnow()
+        query = (
+            select(Session.token)
+            .where(Session.revoked_at.is_not(None), Session.expires_at > now)
+        )
+
+        async with self.transaction() as session:
+            await session.execute(delete(Session).where(Session.expires_at <= now))
+            result = await session.execute(query)
+            self._revoked_sessions = set(result.scalars().all())
+
+    async def refresh_revoked_sessions_periodically(self):
+        while True:
+            await asyncio.sleep(self._revoked_sessions_refresh_interval)
+            await self.refresh_revoked_sessions()
+
+    def verify_token(self, token: str) -> Session | None:
+        token_data = self._token_signer.verify(token)
+        if token_data is None or token_data.session_id in self._revoked_sessions:
+            return None
+
+        return Session(
+            token=token_data.session_id,
+            user_id=token_data.user_id,
+            expires_at=token_data.expires_at,
+        )
+
+    def get_user_session_query(self, token: str):
+        return (
+            select(Session)
+            .where(Session.token == token, Session.expires_at.is_(None))
+        )
 
     async def get_user_session(self, session: AsyncSession, token: str) -> Session | None:
-        query = select(Session).where(Session.token == token)
+        if self._token_signer is not None and self._token_signer.is_signed(token):
+            return self.verify_token(token)
+
+        user_session = self._session_cache.get(token)
+        if user_session is not None:
+            return user_session
+
+        query = self.get_user_session_query(token=token)
 
         result = await session.execute(query)
         user_session = result.scalar_one_or_none()
+        if user_session is not None:
+            # Cached sessions outlive the request, so a rollback of it must not expire them.
+            session.expunge(user_session)
+            self._session_cache.set(token, user_session)
 
         return user_session
 
     def cursor_encode(self, data: CursorData) -> str:
-        datetime_bytes = bytes(struct.pack("d", data.created_at.timestamp()))
-        sense_id_bytes = data.sense_id.bytes
-        cursor_bytes = datetime_bytes + sense_id_bytes
-        return base64.b64encode(cursor_bytes).decode(self.ENCODING)
+        return base64.b64encode(data.sense_id.bytes).decode(self.ENCODING)
+
+    def cursor_bytes_decode(self, cursor: str, sizes: tuple[int, ...]) -> bytes:
+        try:
+            cursor_bytes = base64.b64decode(cursor.encode(self.ENCODING), validate=True)
+        except (binascii.Error, UnicodeEncodeError):
+            raise InvalidCursor()
+        if len(cursor_bytes) not in sizes:
+            raise InvalidCursor()
+        return cursor_bytes
 
     def cursor_decode(self, cursor: str) -> CursorData:
-        cursor_bytes = base64.b64decode(cursor.encode(self.ENCODING))
-        created_at = datetime.fromtimestamp(struct.unpack("d", cursor_bytes[:8])[0])
+        cursor_bytes = self.cursor_bytes_decode(cursor=cursor, sizes=(16, 24))
+        if len(cursor_bytes) == 16:
+            return CursorData(sense_id=uuid.UUID(bytes=cursor_bytes))
+
+        try:
+            created_at = datetime.fromtimestamp(struct.unpack("d", cursor_bytes[:8])[0])
+        except (OverflowError, OSError, ValueError):
+            raise InvalidCursor()
         sense_id = uuid.UUID(bytes=cursor_bytes[8:])
         return CursorData(created_at=created_at, sense_id=sense_id)
 
-    def get_senses_filters(self, user: User) -> list:
-        filters = [Sense.user == user]
+    def get_cursor_key(self, cursor_data: CursorData):
+        # A cursor holds the sense id alone, its creation time is looked up by the primary key
+        # in the same statement.
+        created_at = cursor_data.created_at
+        if created_at is None:
+            created_at = (
+                select(Sense.created_at).where(Sense.id == cursor_data.sense_id)
+                .scalar_subquery()
+            )
+
+        return tuple_(created_at, cursor_data.sense_id)
+
+    def changes_cursor_encode(self, data: ChangesCursorData) -> str:
+        cursor_bytes = struct.pack(">Q", data.version) + data.sense_id.bytes
+        return base64.b64encode(cursor_bytes).decode(self.ENCODING)
+
+    def changes_cursor_decode(self, cursor: str) -> ChangesCursorData:
+        cursor_bytes = self.cursor_bytes_decode(cursor=cursor, sizes=(24,))
+        version = struct.unpack(">Q", cursor_bytes[:8])[0]
+        if version > self.MAX_VERSION:
+            raise InvalidCursor()
+        sense_id = uuid.UUID(bytes=cursor_bytes[8:])
+        return ChangesCursorData(version=version, sense_id=sense_id)
+
+    def get_senses_filters(
+            self,
+            user_id: uuid.UUID,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+            emotion_token: bytes | None = None,
+    ) -> list:
+        filters = [Sense.user_id == user_id, Sense.deleted_at.is_(None)]
+        created_at = Sense.created_at
+        if emotion_token is not None:
+            # Senses with the token are ranged over in the tokens index, so the bounds apply
+            # to its copy of the creation time.
+            created_at = SenseToken.created_at
+            filters.extend([
+                SenseToken.user_id == user_id,
+                SenseToken.token == emotion_token,
+                SenseToken.sense_id == Sense.id,
+            ])
+        if created_from is not None:
+            filters.append(created_at >= created_from)
+        if created_to is not None:
+            filters.append(created_at < created_to)
 
         return filters
 
-    async def get_senses_count(self, session: AsyncSession, user: User) -> int:
-        filters = self.get_senses_filters(user=user)
-        query = select(func.count(Sense.id)).where(*filters)
+    def get_user_data_query(self, user_id: uuid.UUID):
+        return select(User.senses_count, User.data_version).where(User.id == user_id)
 
-        count = await session.scalar(query)
-        return count
+    async def get_user_data(self, session: AsyncSession, user_id: uuid.UUID) -> Row:
+        query = self.get_user_data_query(user_id=user_id)
 
-    async def get_senses(
+        result = await session.execute(query)
+        return result.one()
+
+    async def bump_data_version(
             self,
             session: AsyncSession,
-            user: User,
-            cursor: str | None = None,
+            user_id: uuid.UUID,
+            senses_delta: int = 0,
+    ) -> int:
+        # Every write transaction takes the next version of the user's data and stamps it on
+        # the senses it changes. The UPDATE locks the user row, so versions are committed in
+        # order.
+        query = (
+            update(User).where(User.id == user_id)
+            .values(
+                data_version=User.data_version + 1,
+                senses_count=User.senses_count + senses_delta,
+            )
+            .returning(User.data_version)
+            .execution_options(synchronize_session=False)
+        )
+
+        return await session.scalar(query)
+
+    async def change_senses_count(self, session: AsyncSession, user_id: uuid.UUID, delta: int):
+        query = (
+            update(User).where(User.id == user_id)
+            .values(senses_count=User.senses_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+        await session.execute(query)
+
+    async def check_senses_count(
+            self,
+            session: AsyncSession,
+            repair: bool = False,
+    ) -> list[tuple[uuid.UUID, int, int]]:
+        actual_count = func.count(Sense.id)
+        query = (
+            select(User.id, User.senses_count, actual_count)
+            .outerjoin(Sense, (Sense.user_id == User.id) & Sense.deleted_at.is_(None))
+            .group_by(User.id, User.senses_count)
+            .having(User.senses_count != actual_count)
+        )
+
+        result = await session.execute(query)
+        mismatches = [tuple(row) for row in result.all()]
+
+        if repair:
+            for user_id, _, count in mismatches:
+                query = (
+                    update(User).where(User.id == user_id)
+                    .values(senses_count=count)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.execute(query)
+
+        return mismatches
+
+    def get_senses_query(
+            self,
+            filters: list,
+            cursor_data: CursorData | None = None,
             limit: int = 10,
-    ) -> tuple[list[Sense], str | None, str | None]:
-        filters = self.get_senses_filters(user=user)
-        cursor_data = None if cursor is None else self.cursor_decode(cursor)
+            by_token: bool = False,
+            full: bool = True,
+    ):
+        # The page is a bounded descending range scan from the cursor. Rows above the cursor
+        # are fetched by a bounded ascending scan in the same statement, so the previous
+        # cursor costs no extra round trip and no OFFSET.
+        created_at, sense_id = (
+            (SenseToken.created_at, SenseToken.sense_id) if by_token else
+            (Sense.created_at, Sense.id)
+        )
+        sort_key = tuple_(created_at, sense_id)
+        # Without the full data, the data is only sent for senses which have no preview.
+        data = Sense.data if full else case((Sense.preview.is_(None), Sense.data))
+        columns = [Sense.id, data.label("data"), Sense.preview, Sense.created_at]
 
         current_filters = filters.copy()
-        previous_sense = None
         if cursor_data is not None:
-            current_filters.append(or_(
-                Sense.created_at > cursor_data.created_at,
-                and_(Sense.created_at == cursor_data.created_at, Sense.id > cursor_data.sense_id)
-            ))
-            query = (
-                select(Sense).where(*current_filters)
-                .order_by(Sense.created_at.asc()).offset(limit).limit(1)
-            )
-            result = await session.execute(query)
-            previous_sense = result.scalars().first()
+            current_filters.append(sort_key <= self.get_cursor_key(cursor_data=cursor_data))
+        query = (
+            select(*columns, false().label("is_previous")).where(*current_filters)
+            .order_by(created_at.desc(), sense_id.desc()).limit(limit + 1)
+        )
 
-        current_filters = filters.copy()
         if cursor_data is not None:
-            current_filters.append(or_(
-                Sense.created_at < cursor_data.created_at,
-                and_(Sense.created_at == cursor_data.created_at, Sense.id <= cursor_data.sense_id),
-            ))
-        query = (
-            select(Sense).where(*current_filters)
-            .order_by(Sense.created_at.desc()).limit(limit + 1)
+            previous_filters = filters.copy()
+            previous_filters.append(sort_key > self.get_cursor_key(cursor_data=cursor_data))
+            previous_query = (
+                select(*columns, true().label("is_previous")).where(*previous_filters)
+                .order_by(created_at.asc(), sense_id.asc()).limit(limit)
+            )
+            query = union_all(
+                select(query.subquery()),
+                select(previous_query.subquery()),
+            )
+
+        subquery = query.subquery()
+        return (
+            select(
+                subquery.c.id,
+                subquery.c.data,
+                subquery.c.preview,
+                subquery.c.created_at,
+                subquery.c.is_previous,
+            )
+            .order_by(subquery.c.created_at.desc(), subquery.c.id.desc())
         )
+
+    async def get_senses(
+            self,
+            session: AsyncSession,
+            user_id: uuid.UUID,
+            cursor: str | None = None,
+            limit: int = 10,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+            emotion_token: bytes | None = None,
+            full: bool = True,
+    ) -> tuple[list[Row], str | None, str | None]:
+        filters = self.get_senses_filters(
+            user_id=user_id,
+            created_from=created_from,
+            created_to=created_to,
+            emotion_token=emotion_token,
+        )
+        cursor_data = None if cursor is None else self.cursor_decode(cursor)
+        query = self.get_senses_query(
+            filters=filters,
+            cursor_data=cursor_data,
+            limit=limit,
+            by_token=emotion_token is not None,
+            full=full,
+        )
+
         result = await session.execute(query)
-        senses = list(result.scalars().all())
+        previous_senses, senses = [], []
+        for sense in result.all():
+            (previous_senses if sense.is_previous else senses).append(sense)
 
         previous_cursor = None
-        if previous_sense is not None:
-            previous_cursor_data = CursorData(
-                created_at=previous_sense.created_at,
-                sense_id=previous_sense.id,
-            )
+        if previous_senses:
+            previous_cursor_data = CursorData(sense_id=previous_senses[0].id)
             previous_cursor = self.cursor_encode(data=previous_cursor_data)
 
         next_cursor = None
         if len(senses) == limit + 1:
-            next_cursor_data = CursorData(
-                created_at=senses[-1].created_at,
-                sense_id=senses[-1].id,
-            )
+            next_cursor_data = CursorData(sense_id=senses[-1].id)
             next_cursor = self.cursor_encode(data=next_cursor_data)
 
-        return senses[:-1], previous_cursor, next_cursor
+        return senses[:limit], previous_cursor, next_cursor
+
+    async def stream_senses(
+            self,
+            user_id: uuid.UUID,
+            cursor: str | None = None,
+            batch_size: int = 500,
+    ) -> AsyncIterator[list[Row]]:
+        # Rows are fetched from a server-side cursor batch by batch, so memory doesn't grow with
+        # the diary. The session is its own because streaming outlives the request handler.
+        filters = self.get_senses_filters(user_id=user_id)
+        if cursor is not None:
+            cursor_data = self.cursor_decode(cursor)
+            filters.append(
+                tuple_(Sense.created_at, Sense.id) < self.get_cursor_key(cursor_data=cursor_data),
+            )
+        query = (
+            select(Sense.id, Sense.data, Sense.preview, Sense.created_at).where(*filters)
+            .order_by(Sense.created_at.desc(), Sense.id.desc())
+            .execution_options(yield_per=batch_size)
+        )
+
+        async with self.session(read_only=True) as session:
+            result = await session.stream(query)
+            async for senses in result.partitions():
+                yield senses
 
-    async def create_sense(self, session: AsyncSession, user: User, data: str) -> Sense:
-        sense = Sense(user=user, data=data)
+    def get_senses_histogram_query(self, filters: list):
+        # Only the plaintext creation time is read. The partial index on (user_id, created_at)
+        # finds the user's live senses, but SQLite still visits their rows to check deleted_at,
+        # as it doesn't count the index condition as covered.
+        month = self.MONTHS[self._engine.dialect.name](Sense.created_at).label("month")
+        return (
+            select(month, func.count().label("count")).where(*filters)
+            .group_by(month).order_by(month.desc())
+        )
+
+    async def get_senses_histogram(
+            self,
+            session: AsyncSession,
+            user_id: uuid.UUID,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+    ) -> list[Row]:
+        filters = self.get_senses_filters(
+            user_id=user_id,
+            created_from=created_from,
+            created_to=created_to,
+        )
+        query = self.get_senses_histogram_query(filters=filters)
+
+        result = await session.execute(query)
+        return list(result.all())
+
+    def get_hot_queries(self) -> dict[str, Executable]:
+        user_id = uuid.uuid4()
+        filters = self.get_senses_filters(user_id=user_id)
+        token_filters = self.get_senses_filters(user_id=user_id, emotion_token=b"0" * 16)
+        cursor_data = CursorData(sense_id=uuid.uuid4())
+
+        return {
+            "get_senses": self.get_senses_query(
+                filters=filters,
+                cursor_data=cursor_data,
+                full=False,
+            ),
+            "get_senses_by_emotion_token": self.get_senses_query(
+                filters=token_filters,
+                cursor_data=cursor_data,
+                by_token=True,
+            ),
+            "get_senses_histogram": self.get_senses_histogram_query(filters=filters),
+            "get_user_data": self.get_user_data_query(user_id=user_id),
+            "get_user_session": self.get_user_session_query(token="0" * 32),
+            "get_sense_changes": self.get_sense_changes_query(
+                user_id=user_id,
+                since=0,
+                version=1,
+                cursor_data=ChangesCursorData(version=0, sense_id=uuid.uuid4()),
+            ),
+        }
+
+    async def explain(self, session: AsyncSession, query: Executable) -> list[str]:
+        dialect = self._engine.dialect
+        statement = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        connection = await session.connection()
+
+        if dialect.name == "sqlite":
+            result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}")
+            # Rows form a tree by their parent ids, which the lines keep as indentation.
+            depths, plan = {0: -1}, []
+            for row in result:
+                depths[row.id] = depths[row.parent] + 1
+                plan.append("  " * depths[row.id] + row.detail)
+            return plan
+
+        # Tables of a fresh installation are tiny, so make the planner prefer any usable index
+        # over a sequential scan: only a missing index leads to a full scan then.
+        await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        result = await connection.exec_driver_sql(f"EXPLAIN {statement}")
+        return [row[0] for row in result]
+
+    def sorts_all_rows(self, plan: list[str]) -> bool:
+        if self._engine.dialect.name != "sqlite":
+            return False
+
+        # Lines are grouped into steps by their parent line.
+        steps, parents = {}, []
+        for index, line in enumerate(plan):
+            detail = line.lstrip(" ")
+            del parents[(len(line) - len(detail)) // 2:]
+            steps.setdefault(parents[-1] if parents else None, []).append(detail)
+            parents.append(index)
+        for details in steps.values():
+            if (self.SQLITE_FULL_SORT in details and
+                    any(self.SQLITE_TABLE_READ_PATTERN.search(detail) for detail in details)):
+                return True
+        return False
+
+    async def explain_hot_queries(self) -> dict[str, tuple[list[str], bool]]:
+        full_scan_pattern = self.FULL_SCAN_PATTERNS.get(self._engine.dialect.name)
+        if full_scan_pattern is None:
+            raise ValueError(f"Query plans for {self._engine.dialect.name} are not supported")
+
+        plans = {}
+        async with self.transaction() as session:
+            for name, query in self.get_hot_queries().items():
+                plan = await self.explain(session=session, query=query)
+                uses_index = (
+                    not any(full_scan_pattern.search(line) for line in plan) and
+                    not self.sorts_all_rows(plan=plan)
+                )
+                plans[name] = (plan, uses_index)
+
+        return plans
+
+    def get_sense_tokens_values(
+            self,
+            sense: Row | Sense,
+            user_id: uuid.UUID,
+            emotion_tokens: list[bytes],
+    ) -> list[dict]:
+        return [
+            {
+                "sense_id": sense.id,
+                "token": token,
+                "user_id": user_id,
+                "created_at": sense.created_at,
+            }
+            for token in dict.fromkeys(emotion_tokens)
+        ]
+
+    async def replace_sense_tokens(
+            self,
+            session: AsyncSession,
+            sense: Row,
+            user_id: uuid.UUID,
+            emotion_tokens: list[bytes],
+    ):
+        query = delete(SenseToken).where(SenseToken.sense_id == sense.id)
+        await session.execute(query)
+
+        values = self.get_sense_tokens_values(
+            sense=sense,
+            user_id=user_id,
+            emotion_tokens=emotion_tokens,
+        )
+        if values:
+            await session.execute(insert(SenseToken), values)
+
+    async def create_sense(
+            self,
+            session: AsyncSession,
+            user_id: uuid.UUID,
+            data: bytes,
+            preview: bytes | None = None,
+            emotion_tokens: list[bytes] | None = None,
+    ) -> Sense:
+        version = await self.bump_data_version(session=session, user_id=user_id, senses_delta=1)
+        sense = Sense(
+            id=self._sense_id_factory(),
+            user_id=user_id,
+            data=data,
+            preview=preview,
+            created_at=datetime.utcnow(),
+            version=version,
+        )
 
         session.add(sense)
+        session.add_all(
+            SenseToken(**values)
+            for values in self.get_sense_tokens_values(
+                sense=sense,
+                user_id=user_id,
+                emotion_tokens=emotion_tokens or [],
+            )
+        )
+        self.add_sense_event(
+            session=session,
+            type=SenseEventType.CREATED,
+            user_id=user_id,
+            version=version,
+            sense_ids=[sense.id],
+        )
 
         return sense
 
-    async def get_sense(self, session: AsyncSession, sense_id: uuid.UUID) -> Sense | None:
-        query = select(Sense).where(Sense.id == sense_id)
+    @property
+    def batches_senses(self) -> bool:
+        return self._sense_batcher is not None
+
+    async def create_sense_batched(self, new_sense: NewSense) -> Row:
+        return await self._sense_batcher.submit(new_sense)
+
+    async def insert_senses(self, items: list[NewSense]) -> list[Row]:
+        async with self.transaction() as session:
+            return await self.create_senses(session=session, items=items)
+
+    async def create_senses(
+            self,
+            session: AsyncSession,
+            items: list[NewSense],
+    ) -> list[Row]:
+        if not items:
+            return []
+
+        versions = {}
+        senses_counts = Counter(item.user_id for item in items)
+        # User rows are locked in a fixed order, so concurrent batches can't deadlock.
+        for user_id in sorted(senses_counts):
+            versions[user_id] = await self.bump_data_version(
+                session=session,
+                user_id=user_id,
+                senses_delta=senses_counts[user_id],
+            )
+
+        values = [
+            {
+                "id": self._sense_id_factory(),
+                "user_id": item.user_id,
+                "data": item.data,
+                "preview": item.preview,
+                "version": versions[item.user_id],
+            }
+            for item in items
+        ]
+        query = (
+            insert(Sense).values(values)
+            .returning(Sense.id, Sense.data, Sense.preview, Sense.created_at)
+        )
 
         result = await session.execute(query)
-        sense = result.scalar_one_or_none()
+        senses = {sense.id: sense for sense in result.all()}
+        tokens_values = [
+            token_values
+            for value, item in zip(values, items)
+            for token_values in self.get_sense_tokens_values(
+                sense=senses[value["id"]],
+                user_id=item.user_id,
+                emotion_tokens=item.emotion_tokens,
+            )
+        ]
+        if tokens_values:
+            await session.execute(insert(SenseToken), tokens_values)
+        for user_id, version in versions.items():
+            self.add_sense_event(
+                session=session,
+                type=SenseEventType.CREATED,
+                user_id=user_id,
+                version=version,
+                sense_ids=[value["id"] for value in values if value["user_id"] == user_id],
+            )
+
+        # RETURNING doesn't guarantee the order of a multi-row VALUES.
+        return [senses[value["id"]] for value in values]
+
+    async def get_sense(self, session: AsyncSession, sense_id: uuid.UUID) -> Row | None:
+        query = (
+            select(Sense.id, Sense.user_id, Sense.data, Sense.preview, Sense.created_at)
+            .where(Sense.id == sense_id, Sense.deleted_at.is_(None))
+        )
+
+        result = await session.execute(query)
+        sense = result.one_or_none()
 
         return sense
 
-    async def update_sense(self, session: AsyncSession, sense: Sense, data: str) -> Sense:
-        sense.data = data
+    async def import_senses(
+            self,
+            session: AsyncSession,
+            user_id: uuid.UUID,
+            senses: list[dict],
+    ) -> int:
+        # Senses keep their id and created_at. Ids which already exist are skipped, so
+        # an interrupted import can simply be repeated. Deleted senses are restored.
+        if not senses:
+            return 0
+
+        dialect = self._engine.dialect.name
+        insert_factory = self.INSERTS.get(dialect)
+        if insert_factory is None:
+            raise ValueError(f"Importing into {dialect} is not supported")
+
+        version = await self.bump_data_version(session=session, user_id=user_id)
+        values = [
+            {
+                "id": sense["id"],
+                "user_id": user_id,
+                "data": sense["data"],
+                "preview": sense.get("preview"),
+                "created_at": sense["created_at"],
+                "updated_at": sense["created_at"],
+                "version": version,
+            }
+            for sense in senses
+        ]
+        # SQLAlchemy turns an executemany with RETURNING into multi-row INSERTs ("insertmanyvalues")
+        # from one cached statement, instead of compiling a VALUES clause of the chunk's size.
+        table = Sense.__table__
+        query = (
+            insert_factory(table)
+            .on_conflict_do_nothing(index_elements=[table.c.id])
+            .returning(table.c.id)
+        )
+
+        result = await session.execute(query, values)
+        imported_ids = result.scalars().all()
+        skipped_ids = {value["id"] for value in values}.difference(imported_ids)
+        if skipped_ids:
+            imported_ids += await self.revive_senses(
+                session=session,
+                user_id=user_id,
+                values=[value for value in values if value["id"] in skipped_ids],
+            )
+        imported = len(imported_ids)
+        if imported:
+            await self.change_senses_count(session=session, user_id=user_id, delta=imported)
+            self.add_sense_event(
+                session=session,
+                type=SenseEventType.CREATED,
+                user_id=user_id,
+                version=version,
+                sense_ids=imported_ids,
+            )
+
+        return imported
+
+    async def revive_senses(
+            self,
+            session: AsyncSession,
+            user_id: uuid.UUID,
+            values: list[dict],
+    ) -> list[uuid.UUID]:
+        # Deleted senses keep their ids as tombstones, so importing them again must bring the
+        # tombstones back instead of skipping them as duplicates.
+        query = select(Sense.id).where(
+            Sense.id.in_([value["id"] for value in values]),
+            Sense.user_id == user_id,
+            Sense.deleted_at.is_not(None),
+        )
+        revived_ids = (await session.execute(query)).scalars().all()
+        if not revived_ids:
+            return []
+
+        table = Sense.__table__
+        query = (
+            update(table)
+            .where(table.c.id == bindparam("revived_id"))
+            .values(
+                data=bindparam("revived_data"),
+                preview=bindparam("revived_preview"),
+                created_at=bindparam("revived_created_at"),
+                updated_at=datetime.utcnow(),
+                version=bindparam("revived_version"),
+                deleted_at=None,
+            )
+        )
+        await session.execute(query, [
+            {
+                "revived_id": value["id"],
+                "revived_data": value["data"],
+                "revived_preview": value["preview"],
+                "revived_created_at": value["created_at"],
+                "revived_version": value["version"],
+            }
+            for value in values
+            if value["id"] in revived_ids
+        ])
+
+        return revived_ids
+
+    async def get_senses_by_ids(
+            self,
+            session: AsyncSession,
+            sense_ids: list[uuid.UUID],
+    ) -> list[Row]:
+        query = (
+            select(Sense.id, Sense.user_id, Sense.data, Sense.preview, Sense.created_at)
+            .where(Sense.id.in_(sense_ids), Sense.deleted_at.is_(None))
+        )
+
+        result = await session.execute(query)
+        return result.all()
+
+    async def get_senses_owners(
+            self,
+            session: AsyncSession,
+            sense_ids: list[uuid.UUID],
+    ) -> dict[uuid.UUID, uuid.UUID]:
+        query = (
+            select(Sense.id, Sense.user_id)
+            .where(Sense.id.in_(sense_ids), Sense.deleted_at.is_(None))
+        )
+
+        result = await session.execute(query)
+        return dict(result.tuples().all())
+
+    async def get_sense_owner(self, session: AsyncSession, sense_id: uuid.UUID) -> uuid.UUID | None:
+        query = select(Sense.user_id).where(Sense.id == sense_id, Sense.deleted_at.is_(None))
+
+        return await session.scalar(query)
+
+    async def update_sense(
+            self,
+            session: AsyncSession,
+            sense_id: uuid.UUID,
+            user_id: uuid.UUID,
+            data: bytes,
+            preview: bytes | None = None,
+            emotion_tokens: list[bytes] | None = None,
+    ) -> Row | None:
+        # The preview is replaced together with the data, so a stale one is never shown.
+        version = await self.bump_data_version(session=session, user_id=user_id)
+        query = (
+            update(Sense)
+            .where(Sense.id == sense_id, Sense.user_id == user_id, Sense.deleted_at.is_(None))
+            .values(data=data, preview=preview, version=version, updated_at=datetime.utcnow())
+            .returning(Sense.id, Sense.data, Sense.preview, Sense.created_at)
+            .execution_options(synchronize_session=False)
+        )
+
+        result = await session.execute(query)
+        sense = result.one_or_none()
+        if sense is not None:
+            if emotion_tokens is not None:
+                await self.replace_sense_tokens(
+                    session=session,
+                    sense=sense,
+                    user_id=user_id,
+                    emotion_tokens=emotion_tokens,
+                )
+            self.add_sense_event(
+                session=session,
+                type=SenseEventType.UPDATED,
+                user_id=user_id,
+                version=version,
+                sense_ids=[sense.id],
+            )
 
-        session.add(sense)
-        
         return sense
 
-    async def delete_sense(self, session: AsyncSession, sense: Sense):
-        await session.delete(sense)
+    async def delete_sense(
+            self,
+            session: AsyncSession,
+            sense_id: uuid.UUID,
+            user_id: uuid.UUID,
+    ) -> bool:
+        deleted_ids = await self.delete_senses(
+            session=session,
+            sense_ids=[sense_id],
+            user_id=user_id,
+        )
+
+        return bool(deleted_ids)
+
+    async def delete_senses(
+            self,
+            session: AsyncSession,
+            sense_ids: list[uuid.UUID],
+            user_id: uuid.UUID,
+    ) -> list[uuid.UUID]:
+        # Deleted senses are kept as tombstones without data, so other devices learn about
+        # the deletion from the changes feed.
+        version = await self.bump_data_version(session=session, user_id=user_id)
+        now = datetime.utcnow()
+        query = (
+            update(Sense)
+            .where(
+                Sense.id.in_(sense_ids),
+                Sense.user_id == user_id,
+                Sense.deleted_at.is_(None),
+            )
+            .values(data=b"", preview=None, version=version, updated_at=now, deleted_at=now)
+            .returning(Sense.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        result = await session.execute(query)
+        deleted_ids = result.scalars().all()
+        if deleted_ids:
+            query = delete(SenseToken).where(SenseToken.sense_id.in_(deleted_ids))
+            await session.execute(query)
+            await self.change_senses_count(
+                session=session,
+                user_id=user_id,
+                delta=-len(deleted_ids),
+            )
+            self.add_sense_event(
+                session=session,
+                type=SenseEventType.DELETED,
+                user_id=user_id,
+                version=version,
+                sense_ids=deleted_ids,
+            )
+
+        return deleted_ids
+
+    def get_sense_changes_query(
+            self,
+            user_id: uuid.UUID,
+            since: int,
+            version: int,
+            cursor_data: ChangesCursorData | None = None,
+            limit: int = 100,
+    ):
+        filters = [
+            Sense.user_id == user_id,
+            Sense.version > since,
+            Sense.version <= version,
+        ]
+        if cursor_data is not None:
+            filters.append(
+                tuple_(Sense.version, Sense.id) >
+                tuple_(cursor_data.version, cursor_data.sense_id),
+            )
+
+        return (
+            select(
+                Sense.id,
+                Sense.data,
+                Sense.preview,
+                Sense.created_at,
+                Sense.updated_at,
+                Sense.deleted_at,
+                Sense.version,
+            )
+            .where(*filters)
+            .order_by(Sense.version.asc(), Sense.id.asc())
+            .limit(limit + 1)
+        )
+
+    async def get_sense_changes(
+            self,
+            session: AsyncSession,
+            user_id: uuid.UUID,
+            since: int = 0,
+            cursor: str | None = None,
+            limit: int = 100,
+    ) -> tuple[list[Row], int, str | None]:
+        # Changes are read up to the version committed when the read starts, so the returned
+        # version covers exactly the changes handed out. Pages within it are walked by cursor.
+        version = await session.scalar(select(User.data_version).where(User.id == user_id))
+        cursor_data = None if cursor is None else self.changes_cursor_decode(cursor)
+        query = self.get_sense_changes_query(
+            user_id=user_id,
+            since=since,
+            version=version,
+            cursor_data=cursor_data,
+            limit=limit,
+        )
+
+        result = await session.execute(query)
+        senses = result.all()
+
+        next_cursor = None
+        if len(senses) > limit:
+            senses = senses[:limit]
+            next_cursor_data = ChangesCursorData(version=senses[-1].version, sense_id=senses[-1].id)
+            next_cursor = self.changes_cursor_encode(data=next_cursor_data)
+
+        return senses, version, next_cursor
 
 
-def get_service() -> DatabaseService:
+def get_service(password_hasher: PasswordHasher | None = None) -> DatabaseService:
     settings = DatabaseSettings()
-    return DatabaseService(dsn=str(settings.dsn))
+    session_cache = TTLCache(max_size=settings.session_cache_size, ttl=settings.session_cache_ttl)
+    event_bus = InMemoryEventBus(queue_size=settings.events_queue_size)
+    token_signer = (
+        None
+        if settings.token_secret is None else
+        TokenSigner(secret=settings.token_secret.get_secret_value())
+    )
+    return DatabaseService(
+        dsn=str(settings.dsn),
+        session_cache=session_cache,
+        event_bus=event_bus,
+        password_hasher=password_hasher,
+        token_signer=token_signer,
+        token_ttl=timedelta(seconds=settings.token_ttl),
+        revoked_sessions_refresh_interval=settings.revoked_sessions_refresh_interval,
+        pool_size=settings.pool_size,
+        pool_min_size=settings.pool_min_size,
+        pool_max_overflow=settings.pool_max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+        sqlite_busy_timeout=settings.sqlite_busy_timeout,
+        sqlite_mmap_size=settings.sqlite_mmap_size,
+        sense_batch_enabled=settings.sense_batch_enabled,
+        sense_batch_max_size=settings.sense_batch_max_size,
+        sense_batch_max_delay=settings.sense_batch_max_delay,
+        sense_id_uuid7=settings.sense_id_uuid7,
+    )
@@ -1,4 +1,4 @@
-from pydantic import AnyUrl
+from pydantic import AnyUrl, SecretStr, confloat, conint
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,3 +6,29 @@ class DatabaseSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="backend_database_")
 
     dsn: AnyUrl = "sqlite+aiosqlite:///soul_diary.sqlite3"
+
+    pool_size: conint(ge=1) = 5
+    pool_min_size: conint(ge=0) = 1
+    pool_max_overflow: conint(ge=0) = 10
+    pool_timeout: confloat(gt=0) = 30.0
+    # Seconds after which a connection is reopened, -1 keeps connections forever.
+    pool_recycle: conint(ge=-1) = 3600
+    pool_pre_ping: bool = True
+
+    sqlite_busy_timeout: conint(ge=0) = 5000
+    sqlite_mmap_size: conint(ge=0) = 256 * 1024 * 1024
+
+    sense_batch_enabled: bool = False
+    sense_batch_max_size: conint(ge=1) = 64
+    sense_batch_max_delay: confloat(ge=0) = 0.005
+    # Time-ordered ids keep inserts of new senses at the end of the indexes.
+    sense_id_uuid7: bool = False
+
+    session_cache_size: conint(ge=0) = 1024
+    session_cache_ttl: confloat(gt=0) = 60.0
+
+    events_queue_size: conint(ge=1) = 256
+
+    token_secret: SecretStr | None = None
+    token_ttl: conint(gt=0) = 30 * 24 * 60 * 60
+    revoked_sessions_refresh_interval: confloat(gt=0) = 30.0
@@ -0,0 +1,66 @@
+import base64
+import calendar
+import hashlib
+import hmac
+import struct
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class TokenData(BaseModel):
+    user_id: uuid.UUID
+    session_id: str
+    expires_at: datetime
+
+
+class TokenSigner:
+    ENCODING = "utf-8"
+    SEPARATOR = "."
+    DIGEST = hashlib.sha256
+
+    def __init__(self, secret: str):
+        self._secret = secret.encode(self.ENCODING)
+
+    def get_signature(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, self.DIGEST).digest()
+
+    def encode(self, data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode(self.ENCODING)
+
+    def decode(self, data: str) -> bytes:
+        return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+    def is_signed(self, token: str) -> bool:
+        return self.SEPARATOR in token
+
+    def sign(self, data: TokenData) -> str:
+        payload = (
+            data.user_id.bytes +
+            struct.pack(">Q", calendar.timegm(data.expires_at.utctimetuple())) +
+            data.session_id.encode(self.ENCODING)
+        )
+        signature = self.get_signature(payload)
+
+        return self.encode(payload) + self.SEPARATOR + self.encode(signature)
+
+    def verify(self, token: str) -> TokenData | None:
+        try:
+            payload_string, signature_string = token.split(self.SEPARATOR)
+            payload = self.decode(payload_string)
+            signature = self.decode(signature_string)
+        except ValueError:
+            return None
+
+        if len(payload) <= 24 or not hmac.compare_digest(signature, self.get_signature(payload)):
+            return None
+
+        user_id = uuid.UUID(bytes=payload[:16])
+        # Expiry is naive UTC, like every other time the service keeps.
+        expires_at = datetime.utcfromtimestamp(struct.unpack(">Q", payload[16:24])[0])
+        session_id = payload[24:].decode(self.ENCODING)
+        if expires_at <= datetime.utcnow():
+            return None
+
+        return TokenData(user_id=user_id, session_id=session_id, expires_at=expires_at)
@@ -1,22 +1,58 @@
-import base64
 import hashlib
+import hmac
 import json
 import uuid
-from typing import Any
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator
 
 from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
 
 from soul_diary.ui.app.local_storage import LocalStorage
-from soul_diary.ui.app.models import BackendType, Emotion, Sense
-from .models import EncryptedSense, EncryptedSenseList, SenseList, Options
+from soul_diary.ui.app.models import BackendType, Emotion, Sense, SensePreview
+from .models import (
+    EncryptedSense,
+    EncryptedSenseChange,
+    EncryptedSenseList,
+    NewEncryptedSense,
+    Options,
+    SenseEvent,
+    SenseList,
+    SenseMonth,
+)
+
+# The module is private, so GCM is assumed to be accelerated when it's missing.
+try:
+    from Cryptodome.Util._cpu_features import have_clmul
+except ImportError:
+    def have_clmul() -> bool:
+        return True
 
 
 class BaseBackend:
     BACKEND: BackendType
-    NONCE = b"\x00" * 16
-    MODE = AES.MODE_EAX
+    # Records written before the envelope are bare EAX ciphertexts under a fixed nonce.
+    LEGACY_NONCE = b"\x00" * 16
+    LEGACY_MODE = AES.MODE_EAX
+    # An envelope is the version, the flags, a random nonce, the tag and the ciphertext. The
+    # version names the mode: GCM is faster with carry-less multiplication in hardware, EAX
+    # otherwise.
+    ENVELOPE_MODES = {
+        1: (AES.MODE_GCM, 12),
+        2: (AES.MODE_EAX, 16),
+    }
+    ENVELOPE_VERSION = 1 if have_clmul() else 2
+    ENVELOPE_COMPRESSED = 0x01
+    ENVELOPE_TAG_SIZE = 16
+    COMPRESSION_MIN_SIZE = 256
+    # Higher levels gain little on diary text but are several times slower to write.
+    COMPRESSION_LEVEL = 3
     ENCODING = "utf-8"
     ENCRYPTION_KEY_TEMPLATE = "backend:encryption_key:{username}:{password}"
+    EMOTION_TOKEN_TEMPLATE = "backend:emotion_token:{emotion}"
+    EMOTION_TOKEN_SIZE = 16
+    PREVIEW_FEELINGS_LENGTH = 200
 
     def __init__(
             self,
@@ -42,31 +78,91 @@ class BaseBackend:
         )
         return hashlib.sha256(data).hexdigest().encode(self.ENCODING)[:16]
 
-    def encode(self, data: dict[str, Any]) -> str:
+    def encode(self, data: dict[str, Any]) -> bytes:
         if self._encryption_key is None:
             raise ValueError("Need crypto key. For generating key you should authenticate.")
 
-        cipher = AES.new(self._encryption_key, self.MODE, nonce=self.NONCE)
-
-        data_string = json.dumps(data)
+        data_string = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
         data_bytes = data_string.encode(self.ENCODING)
-        data_bytes_encoded, _ = cipher.encrypt_and_digest(data_bytes)
-        data_bytes_encoded_base64 = base64.b64encode(data_bytes_encoded).decode(self.ENCODING)
-        
-        return data_bytes_encoded_base64
+        flags = 0
+        if len(data_bytes) >= self.COMPRESSION_MIN_SIZE:
+            data_bytes_compressed = zlib.compress(data_bytes, self.COMPRESSION_LEVEL)
+            if len(data_bytes_compressed) < len(data_bytes):
+                data_bytes = data_bytes_compressed
+                flags |= self.ENVELOPE_COMPRESSED
+
+        # The header is authenticated along with the ciphertext.
+        header = bytes((self.ENVELOPE_VERSION, flags))
+        mode, nonce_size = self.ENVELOPE_MODES[self.ENVELOPE_VERSION]
+        nonce = get_random_bytes(nonce_size)
+        cipher = AES.new(self._encryption_key, mode, nonce=nonce)
+        cipher.update(header)
+        data_bytes_encoded, tag = cipher.encrypt_and_digest(data_bytes)
+
+        return header + nonce + tag + data_bytes_encoded
+
+    def open_envelope(self, data: bytes) -> bytes | None:
+        if not data or data[0] not in self.ENVELOPE_MODES:
+            return None
+
+        mode, nonce_size = self.ENVELOPE_MODES[data[0]]
+        header_size = 2 + nonce_size + self.ENVELOPE_TAG_SIZE
+        if len(data) < header_size:
+            return None
+        header, nonce = data[:2], data[2:2 + nonce_size]
+        tag, data_bytes_encoded = data[2 + nonce_size:header_size], data[header_size:]
+
+        cipher = AES.new(self._encryption_key, mode, nonce=nonce)
+        cipher.update(header)
+        try:
+            data_bytes = cipher.decrypt_and_verify(data_bytes_encoded, tag)
+        except ValueError:
+            return None
+
+        if header[1] & self.ENVELOPE_COMPRESSED:
+            data_bytes = zlib.decompress(data_bytes)
+        return data_bytes
+
+    def decode(self, data: bytes) -> dict[str, Any]:
+        if self._encryption_key is None:
+            raise ValueError("Need crypto key. For generating key you should authenticate.")
 
-    def decode(self, data: str) -> dict[str, Any]:
+        # A legacy record may start with a version byte by chance, but its tag won't verify.
+        data_bytes = self.open_envelope(data)
+        if data_bytes is not None:
+            return json.loads(data_bytes.decode(self.ENCODING))
+
+        # Legacy records carry no tag, so only a plaintext which parses as a legacy record is
+        # accepted. Tampered envelopes and wrong keys end up here too.
+        cipher = AES.new(self._encryption_key, self.LEGACY_MODE, nonce=self.LEGACY_NONCE)
+        data_bytes = cipher.decrypt(data)
+        try:
+            data_decoded = json.loads(data_bytes.decode(self.ENCODING))
+        except ValueError:
+            data_decoded = None
+        if not isinstance(data_decoded, dict):
+            raise ValueError("sense data failed authentication")
+
+        return data_decoded
+
+    def get_emotion_token(self, emotion: Emotion) -> bytes:
+        # The server indexes senses by these tokens, but without the key it can't tell which
+        # emotion a token stands for.
         if self._encryption_key is None:
             raise ValueError("Need crypto key. For generating key you should authenticate.")
 
-        cipher = AES.new(self._encryption_key, self.MODE, nonce=self.NONCE)
+        data = self.EMOTION_TOKEN_TEMPLATE.format(emotion=emotion.value).encode(self.ENCODING)
+        token = hmac.new(self._encryption_key, data, hashlib.sha256).digest()
+        return token[:self.EMOTION_TOKEN_SIZE]
 
-        data_bytes_encoded = base64.b64decode(data)
-        data_bytes = cipher.decrypt(data_bytes_encoded)
-        data_string = data_bytes.decode(self.ENCODING)
-        data_decoded = json.loads(data_string)
+    def get_emotion_tokens(self, emotions: list[Emotion]) -> list[bytes]:
+        return [self.get_emotion_token(emotion) for emotion in emotions]
 
-        return data_decoded
+    def encode_preview(self, emotions: list[Emotion], feelings: str) -> bytes:
+        # Cards of the list show the emotions and the beginning of the feelings only, so they
+        # are encrypted apart from the whole sense.
+        data = {"emotions": emotions, "feelings": feelings[:self.PREVIEW_FEELINGS_LENGTH]}
+        return self.encode(data)
 
     def convert_encrypted_sense_to_sense(self, sense_data: EncryptedSense) -> Sense:
         return Sense(
@@ -75,6 +171,16 @@ class BaseBackend:
             **self.decode(sense_data.data),
         )
 
+    def convert_encrypted_sense_to_preview(self, sense_data: EncryptedSense) -> SensePreview:
+        if sense_data.data is not None:
+            return self.convert_encrypted_sense_to_sense(sense_data)
+
+        return SensePreview(
+            id=sense_data.id,
+            created_at=sense_data.created_at,
+            **self.decode(sense_data.preview),
+        )
+
     async def registration(self, username: str, password: str):
         self._token = await self.create_user(username=username, password=password)
         self._encryption_key = self.generate_encryption_key(username=username, password=password)
@@ -110,10 +216,26 @@ class BaseBackend:
     def is_auth(self) -> bool:
         return all((self._token, self._encryption_key))
 
-    async def get_sense_list(self, cursor: str | None = None, limit: int = 10) -> SenseList:
-        encrypted_sense_list = await self.fetch_sense_list(cursor=cursor, limit=limit)
+    async def get_sense_list(
+            self,
+            cursor: str | None = None,
+            limit: int = 10,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+            emotion: Emotion | None = None,
+            full: bool = False,
+    ) -> SenseList:
+        # Without `full` the list holds previews, whole senses are fetched with `get_sense`.
+        encrypted_sense_list = await self.fetch_sense_list(
+            cursor=cursor,
+            limit=limit,
+            created_from=created_from,
+            created_to=created_to,
+            emotion_token=None if emotion is None else self.get_emotion_token(emotion),
+            full=full,
+        )
         data = [
-            self.convert_encrypted_sense_to_sense(encrypted_sense)
+            self.convert_encrypted_sense_to_preview(encrypted_sense)
             for encrypted_sense in encrypted_sense_list.data
         ]
         return SenseList(
@@ -139,7 +261,11 @@ class BaseBackend:
         }
         encoded_data = self.encode(data)
 
-        encrypted_sense = await self.pull_sense_data(data=encoded_data)
+        encrypted_sense = await self.pull_sense_data(
+            data=encoded_data,
+            preview=self.encode_preview(emotions=emotions, feelings=feelings),
+            emotion_tokens=self.get_emotion_tokens(emotions),
+        )
 
         return self.convert_encrypted_sense_to_sense(encrypted_sense)
 
@@ -147,6 +273,13 @@ class BaseBackend:
         encrypted_sense = await self.fetch_sense(sense_id=sense_id)
         return self.convert_encrypted_sense_to_sense(encrypted_sense)
 
+    async def get_senses(self, sense_ids: list[uuid.UUID]) -> list[Sense]:
+        encrypted_senses = await self.fetch_senses(sense_ids=sense_ids)
+        return [
+            self.convert_encrypted_sense_to_sense(encrypted_sense)
+            for encrypted_sense in encrypted_senses
+        ]
+
     async def edit_sense(
             self,
             sense_id: uuid.UUID,
@@ -162,8 +295,17 @@ class BaseBackend:
             "desires": desires,
         }
         encoded_data = self.encode(data)
-
-        encrypted_sense = await self.pull_sense_data(data=encoded_data, sense_id=sense_id)
+        # Without a new preview the old one is dropped, and lists fall back to the whole sense.
+        preview = None
+        if emotions is not None and feelings is not None:
+            preview = self.encode_preview(emotions=emotions, feelings=feelings)
+
+        encrypted_sense = await self.pull_sense_data(
+            data=encoded_data,
+            sense_id=sense_id,
+            preview=preview,
+            emotion_tokens=None if emotions is None else self.get_emotion_tokens(emotions),
+        )
 
         return self.convert_encrypted_sense_to_sense(encrypted_sense)
 
@@ -186,18 +328,45 @@ class BaseBackend:
             self,
             cursor: str | None = None,
             limit: int = 10,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+            emotion_token: bytes | None = None,
+            full: bool = False,
     ) -> EncryptedSenseList:
         raise NotImplementedError
 
+    async def fetch_sense_histogram(self) -> list[SenseMonth]:
+        raise NotImplementedError
+
     async def fetch_sense(self, sense_id: uuid.UUID) -> EncryptedSense:
         raise NotImplementedError
 
     async def pull_sense_data(
             self,
-            data: str,
+            data: bytes,
             sense_id: uuid.UUID | None = None,
+            preview: bytes | None = None,
+            emotion_tokens: list[bytes] | None = None,
     ) -> EncryptedSense:
         raise NotImplementedError
 
     async def delete_sense(self, sense_id: uuid.UUID):
         raise NotImplementedError
+
+    async def fetch_senses(self, sense_ids: list[uuid.UUID]) -> list[EncryptedSense]:
+        raise NotImplementedError
+
+    async def pull_senses_data(self, senses: list[NewEncryptedSense]) -> list[EncryptedSense]:
+        raise NotImplementedError
+
+    async def delete_senses(self, sense_ids: list[uuid.UUID]) -> list[uuid.UUID]:
+        raise NotImplementedError
+
+    async def fetch_sense_changes(
+            self,
+            since: int = 0,
+    ) -> tuple[list[EncryptedSenseChange], int]:
+        raise NotImplementedError
+
+    def listen_sense_events(self) -> AsyncIterator[SenseEvent]:
+        raise NotImplementedError
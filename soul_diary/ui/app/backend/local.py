@@ -2,7 +2,8 @@ import base64
 import hashlib
 import struct
 import uuid
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timezone
 from typing import Any
 
 from pydantic import BaseModel
@@ -15,7 +16,7 @@ from .exceptions import (
     SenseNotFoundException,
     UserAlreadyExistsException,
 )
-from .models import EncryptedSense, EncryptedSenseList, Options
+from .models import EncryptedSense, EncryptedSenseList, Options, SenseMonth, encode_base64
 
 
 class CursorData(BaseModel):
@@ -85,6 +86,10 @@ class LocalBackend(BaseBackend):
             self,
             cursor: str | None = None,
             limit: int = 10,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+            emotion_token: bytes | None = None,
+            full: bool = False,
     ) -> EncryptedSenseList:
         if not self.is_auth:
             raise NonAuthenticatedException()
@@ -92,19 +97,38 @@ class LocalBackend(BaseBackend):
         sense_list_key = self.SENSE_LIST_KEY_TEMPLATE.format(username=self._username)
         sense_list = await self._local_storage.raw_read(sense_list_key) or []
         total_items = len(sense_list)
+        if created_from is not None or created_to is not None:
+            # Creation times are stored as naive UTC.
+            created_from, created_to = (
+                value.astimezone(timezone.utc).replace(tzinfo=None)
+                if value is not None and value.tzinfo is not None else value
+                for value in (created_from, created_to)
+            )
+            sense_list = [
+                sense for sense in sense_list
+                if (created_from is None or
+                    created_from <= datetime.fromisoformat(sense["created_at"])) and
+                   (created_to is None or
+                    datetime.fromisoformat(sense["created_at"]) < created_to)
+            ]
+        if emotion_token is not None:
+            emotion_token = encode_base64(emotion_token)
+            sense_list = [
+                sense for sense in sense_list
+                if emotion_token in sense.get("emotion_tokens", [])
+            ]
 
         index = 0
         if cursor is not None:
+            # The cursor is looked up in the filtered list, which may be shorter than the diary.
             cursor_data = self.cursor_decode(cursor)
-            cursor_sense = EncryptedSense.model_validate(sense_list[0])
-            while (
-                    index < total_items and
-                    (cursor_data.created_at < cursor_sense.created_at or
-                     cursor_data.created_at == cursor_sense.created_at and
-                     cursor_data.sense_id < cursor_sense.id)
-            ):
-                index += 1
+            while index < len(sense_list):
                 cursor_sense = EncryptedSense.model_validate(sense_list[index])
+                if not (cursor_data.created_at < cursor_sense.created_at or
+                        cursor_data.created_at == cursor_sense.created_at and
+                        cursor_data.sense_id < cursor_sense.id):
+                    break
+                index += 1
 
         previous_cursor = None
         if index - limit >= 0:
@@ -125,6 +149,11 @@ class LocalBackend(BaseBackend):
 
         sense_list = sense_list[index:index + limit]
         data = [EncryptedSense.model_validate(sense) for sense in sense_list]
+        if not full:
+            data = [
+                sense if sense.preview is None else sense.model_copy(update={"data": None})
+                for sense in data
+            ]
         return EncryptedSenseList(
             data=data,
             limit=limit,
@@ -133,6 +162,19 @@ class LocalBackend(BaseBackend):
             next=next_cursor,
         )
 
+    async def fetch_sense_histogram(self) -> list[SenseMonth]:
+        if not self.is_auth:
+            raise NonAuthenticatedException()
+
+        sense_list_key = self.SENSE_LIST_KEY_TEMPLATE.format(username=self._username)
+        sense_list = await self._local_storage.raw_read(sense_list_key) or []
+        months = Counter(sense["created_at"][:7] for sense in sense_list)
+
+        return [
+            SenseMonth(month=month, count=count)
+            for month, count in sorted(months.items(), reverse=True)
+        ]
+
     async def fetch_sense(self, sense_id: uuid.UUID) -> EncryptedSense:
         sense_list = await self.fetch_sense_list()
 
@@ -142,7 +184,13 @@ class LocalBackend(BaseBackend):
 
         raise SenseNotFoundException()
 
-    async def pull_sense_data(self, data: str, sense_id: uuid.UUID | None = None) -> EncryptedSense:
+    async def pull_sense_data(
+            self,
+            data: bytes,
+            sense_id: uuid.UUID | None = None,
+            preview: bytes | None = None,
+            emotion_tokens: list[bytes] | None = None,
+    ) -> EncryptedSense:
         sense_list_key = self.SENSE_LIST_KEY_TEMPLATE.format(username=self._username)
         sense_list = await self._local_storage.raw_read(sense_list_key)
 
@@ -154,6 +202,7 @@ class LocalBackend(BaseBackend):
             sense = EncryptedSense(
                 id=sense_id,
                 data=data,
+                preview=preview,
                 created_at=datetime.utcnow(),
             )
             index = 0
@@ -166,6 +215,7 @@ class LocalBackend(BaseBackend):
             ):
                 index += 1
             sense_list.insert(index, sense.model_dump(mode="json"))
+            sense_list[index]["emotion_tokens"] = list(map(encode_base64, emotion_tokens or []))
         else:
             for index, sense in enumerate(sense_list):
                 if sense.id == sense_id:
@@ -175,7 +225,10 @@ class LocalBackend(BaseBackend):
 
             sense = sense_list[index]
             sense.data = data
+            sense.preview = preview
             sense_list[index] = sense.model_dump(mode="json")
+            if emotion_tokens is not None:
+                sense_list[index]["emotion_tokens"] = list(map(encode_base64, emotion_tokens))
 
         await self._local_storage.raw_write(sense_list_key, sense_list)
 
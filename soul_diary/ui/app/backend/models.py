@@ -1,9 +1,31 @@
+import base64
+import enum
 import uuid
 from datetime import datetime
+from typing import Annotated, Any
 
-from pydantic import BaseModel, NonNegativeInt
+import httpx
+from pydantic import BaseModel, BeforeValidator, ConfigDict, NonNegativeInt, PlainSerializer
 
-from soul_diary.ui.app.models import Sense
+from soul_diary.ui.app.models import SensePreview
+
+
+def decode_base64(value: Any) -> Any:
+    if isinstance(value, str):
+        return base64.b64decode(value, validate=True)
+    return value
+
+
+def encode_base64(value: bytes) -> str:
+    return base64.b64encode(value).decode("utf-8")
+
+
+# Ciphertexts are kept as bytes and travel as base64 strings in JSON.
+Base64Data = Annotated[
+    bytes,
+    BeforeValidator(decode_base64),
+    PlainSerializer(encode_base64, return_type=str, when_used="json"),
+]
 
 
 class Paginated(BaseModel):
@@ -16,17 +38,61 @@ class Paginated(BaseModel):
 
 class EncryptedSense(BaseModel):
     id: uuid.UUID
-    data: str
+    # List pages leave the data out when the preview is enough.
+    data: Base64Data | None = None
+    preview: Base64Data | None = None
     created_at: datetime
 
 
+class NewEncryptedSense(BaseModel):
+    data: Base64Data
+    preview: Base64Data | None = None
+    emotion_tokens: list[Base64Data] = []
+
+
+class EncryptedSenseChange(BaseModel):
+    id: uuid.UUID
+    data: Base64Data | None = None
+    preview: Base64Data | None = None
+    created_at: datetime
+    updated_at: datetime
+    deleted: bool
+    version: NonNegativeInt
+
+
+class SenseEventType(str, enum.Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    RESYNC = "resync"
+
+
+class SenseEvent(BaseModel):
+    type: SenseEventType
+    version: NonNegativeInt
+    sense_ids: list[uuid.UUID] = []
+
+
 class EncryptedSenseList(Paginated):
     data: list[EncryptedSense]
 
 
 class SenseList(Paginated):
-    data: list[Sense]
+    data: list[SensePreview]
+
+
+class SenseMonth(BaseModel):
+    month: str
+    count: NonNegativeInt
 
 
 class Options(BaseModel):
     registration_enabled: bool
+
+
+class CachedResponse(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    response: httpx.Response
+    etag: str | None = None
+    expires_at: float | None = None
@@ -1,5 +1,10 @@
+import json
+import re
+import time
 import uuid
-from typing import Any
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator
 
 import httpx
 import yarl
@@ -14,11 +19,29 @@ from .exceptions import (
     SenseNotFoundException,
     UserAlreadyExistsException,
 )
-from .models import EncryptedSense, EncryptedSenseList, Options
+from .models import (
+    CachedResponse,
+    EncryptedSense,
+    EncryptedSenseChange,
+    EncryptedSenseList,
+    NewEncryptedSense,
+    Options,
+    SenseEvent,
+    SenseMonth,
+    encode_base64,
+)
 
 
 class SoulBackend(BaseBackend):
     BACKEND = BackendType.SOUL
+    BATCH_SIZE = 100
+    RAW_MEDIA_TYPE = "application/octet-stream"
+    EMOTION_TOKENS_HEADER = "X-Sense-Emotion-Tokens"
+    PREVIEW_HEADER = "X-Sense-Preview"
+    MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+    # Shared by all clients, so a new client for the same server reuses fresh responses.
+    RESPONSES_CACHE: OrderedDict[tuple, CachedResponse] = OrderedDict()
+    RESPONSES_CACHE_SIZE = 256
 
     def __init__(
             self,
@@ -41,26 +64,76 @@ class SoulBackend(BaseBackend):
     def get_backend_data(self) -> dict[str, Any]:
         return {"url": str(self._url)}
 
-    async def request(
+    def get_headers(self) -> dict[str, str]:
+        headers = {}
+        if self._token:
+            headers["Authorization"] = f"Bearer {self._token}"
+
+        return headers
+
+    def cache_response(self, key: tuple, response: httpx.Response):
+        etag = response.headers.get("ETag")
+        cache_control = response.headers.get("Cache-Control", "")
+        max_age = self.MAX_AGE_PATTERN.search(cache_control)
+        if etag is None and max_age is None:
+            return
+
+        expires_at = None
+        if max_age is not None and "no-cache" not in cache_control:
+            expires_at = time.monotonic() + int(max_age.group(1))
+
+        self.RESPONSES_CACHE[key] = CachedResponse(
+            response=response,
+            etag=etag,
+            expires_at=expires_at,
+        )
+        self.RESPONSES_CACHE.move_to_end(key)
+        while len(self.RESPONSES_CACHE) > self.RESPONSES_CACHE_SIZE:
+            self.RESPONSES_CACHE.popitem(last=False)
+
+    def purge_responses(self, token: str | None):
+        for key in [key for key in self.RESPONSES_CACHE if key[0] == token]:
+            del self.RESPONSES_CACHE[key]
+
+    async def send(
             self,
             method: str,
             path: str,
-            json = None,
+            json=None,
             params: dict[str, Any] | None = None,
-    ):
+            content: bytes | None = None,
+            headers: dict[str, str] | None = None,
+    ) -> httpx.Response:
         url = self._url / path.lstrip("/")
-        headers = {}
-        if self._token:
-            headers["Authorization"] = f"Bearer {self._token}"
+        headers = {**self.get_headers(), **(headers or {})}
+        if content is not None:
+            headers["Content-Type"] = self.RAW_MEDIA_TYPE
+
+        # GET responses are remembered per token, so unchanged data is revalidated with
+        # If-None-Match instead of being downloaded again.
+        cache_key, cached = None, None
+        if method == "GET":
+            cache_key = (self._token, str(url.with_query(params)))
+            cached = self.RESPONSES_CACHE.get(cache_key)
+        if cached is not None:
+            if cached.expires_at is not None and cached.expires_at > time.monotonic():
+                return cached.response
+            if cached.etag is not None:
+                headers["If-None-Match"] = cached.etag
 
         response = await self._client.request(
             method=method,
             url=str(url),
             json=json,
             params=params,
+            content=content,
             headers=headers,
         )
 
+        if cached is not None and response.status_code == 304:
+            self.cache_response(key=cache_key, response=cached.response)
+            return cached.response
+
         try:
             response.raise_for_status()
         except httpx.HTTPStatusError as exc:
@@ -69,8 +142,28 @@ class SoulBackend(BaseBackend):
             else:
                 raise exc
 
+        if cache_key is not None:
+            self.cache_response(key=cache_key, response=response)
+
+        return response
+
+    async def request(
+            self,
+            method: str,
+            path: str,
+            json = None,
+            params: dict[str, Any] | None = None,
+    ):
+        response = await self.send(method=method, path=path, json=json, params=params)
         return response.json()
 
+    def convert_raw_response_to_sense(self, response: httpx.Response) -> EncryptedSense:
+        return EncryptedSense(
+            id=response.headers["X-Sense-Id"],
+            data=response.content,
+            created_at=response.headers["X-Sense-Created-At"],
+        )
+
     async def create_user(self, username: str, password: str) -> str:
         path = "/signup"
         data = {
@@ -108,7 +201,11 @@ class SoulBackend(BaseBackend):
     async def deauth(self):
         path = "/logout"
 
-        await self.request(method="POST", path=path)
+        try:
+            await self.request(method="POST", path=path)
+        finally:
+            # Cached responses hold the user's senses, so they don't outlive the session.
+            self.purge_responses(token=self._token)
 
     async def get_options(self) -> Options:
         path = "/options"
@@ -121,9 +218,20 @@ class SoulBackend(BaseBackend):
             self,
             cursor: str | None = None,
             limit: int = 10,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+            emotion_token: bytes | None = None,
+            full: bool = False,
     ) -> EncryptedSenseList:
         path = "/senses/"
-        params = {"limit": limit, "cursor": cursor}
+        params = {
+            "limit": limit,
+            "cursor": cursor,
+            "from": None if created_from is None else created_from.isoformat(),
+            "to": None if created_to is None else created_to.isoformat(),
+            "emotion_token": None if emotion_token is None else encode_base64(emotion_token),
+            "full": "true" if full else None,
+        }
         params = {key: value for key, value in params.items() if value is not None}
 
         response = await self.request(method="GET", path=path, params=params)
@@ -137,36 +245,49 @@ class SoulBackend(BaseBackend):
             next=response["next"],
         )
 
+    async def fetch_sense_histogram(self) -> list[SenseMonth]:
+        path = "/senses/histogram"
+
+        response = await self.request(method="GET", path=path)
+
+        return [SenseMonth.model_validate(month) for month in response["data"]]
+
     async def fetch_sense(self, sense_id: uuid.UUID) -> EncryptedSense:
-        path = f"/senses/{sense_id}"
+        path = f"/senses/{sense_id}/raw"
 
         try:
-            response = await self.request(method="GET", path=path)
+            response = await self.send(method="GET", path=path)
         except httpx.HTTPStatusError as exc:
             if exc.response.status_code == 404:
                 raise SenseNotFoundException()
             else:
                 raise exc
 
-        return EncryptedSense.model_validate(response)
+        return self.convert_raw_response_to_sense(response)
 
     async def pull_sense_data(
             self,
-            data: str,
+            data: bytes,
             sense_id: uuid.UUID | None = None,
+            preview: bytes | None = None,
+            emotion_tokens: list[bytes] | None = None,
     ) -> EncryptedSense:
-        path = "/senses/" if sense_id is None else f"/senses/{sense_id}"
-        request_data = {"data": data}
+        path = "/senses/raw" if sense_id is None else f"/senses/{sense_id}/raw"
+        headers = {}
+        if preview is not None:
+            headers[self.PREVIEW_HEADER] = encode_base64(preview)
+        if emotion_tokens is not None:
+            headers[self.EMOTION_TOKENS_HEADER] = ",".join(map(encode_base64, emotion_tokens))
 
         try:
-            response = await self.request(method="POST", path=path, json=request_data)
+            response = await self.send(method="POST", path=path, content=data, headers=headers)
         except httpx.HTTPStatusError as exc:
             if exc.response.status_code == 404:
                 raise SenseNotFoundException()
             else:
                 raise exc
 
-        return EncryptedSense.model_validate(response)
+        return self.convert_raw_response_to_sense(response)
 
     async def delete_sense(self, sense_id: uuid.UUID):
         path = f"/senses/{sense_id}"
@@ -178,3 +299,90 @@ class SoulBackend(BaseBackend):
                 raise SenseNotFoundException()
             else:
                 raise exc
+
+    async def fetch_senses(self, sense_ids: list[uuid.UUID]) -> list[EncryptedSense]:
+        path = "/senses/batch-get"
+
+        senses = []
+        for index in range(0, len(sense_ids), self.BATCH_SIZE):
+            batch = sense_ids[index:index + self.BATCH_SIZE]
+            request_data = {"ids": [str(sense_id) for sense_id in batch]}
+            response = await self.request(method="POST", path=path, json=request_data)
+            senses.extend(
+                EncryptedSense.model_validate(item["sense"])
+                for item in response["data"]
+                if item["status"] == "ok"
+            )
+
+        return senses
+
+    async def pull_senses_data(self, senses: list[NewEncryptedSense]) -> list[EncryptedSense]:
+        path = "/senses/batch"
+
+        created_senses = []
+        for index in range(0, len(senses), self.BATCH_SIZE):
+            batch = senses[index:index + self.BATCH_SIZE]
+            request_data = {"data": [sense.model_dump(mode="json") for sense in batch]}
+            response = await self.request(method="POST", path=path, json=request_data)
+            created_senses.extend(
+                EncryptedSense.model_validate(item["sense"])
+                for item in response["data"]
+            )
+
+        return created_senses
+
+    async def delete_senses(self, sense_ids: list[uuid.UUID]) -> list[uuid.UUID]:
+        path = "/senses/batch-delete"
+
+        deleted_ids = []
+        for index in range(0, len(sense_ids), self.BATCH_SIZE):
+            batch = sense_ids[index:index + self.BATCH_SIZE]
+            request_data = {"ids": [str(sense_id) for sense_id in batch]}
+            response = await self.request(method="POST", path=path, json=request_data)
+            deleted_ids.extend(
+                uuid.UUID(item["id"])
+                for item in response["data"]
+                if item["status"] == "ok"
+            )
+
+        return deleted_ids
+
+    async def fetch_sense_changes(
+            self,
+            since: int = 0,
+    ) -> tuple[list[EncryptedSenseChange], int]:
+        # Returns every change after the given version and the version to pass next time,
+        # so a local replica costs traffic proportional to the changes only.
+        path = "/senses/changes"
+        params = {"since": since}
+
+        changes = []
+        while True:
+            response = await self.request(method="GET", path=path, params=params)
+            changes.extend(EncryptedSenseChange.model_validate(item) for item in response["data"])
+            if response["next"] is None:
+                return changes, response["version"]
+            params["cursor"] = response["next"]
+
+    async def listen_sense_events(self) -> AsyncIterator[SenseEvent]:
+        url = self._url / "senses/events"
+
+        async with self._client.stream(
+                method="GET",
+                url=str(url),
+                headers=self.get_headers(),
+                timeout=None,
+        ) as response:
+            if response.status_code == 401:
+                raise NonAuthenticatedException()
+            response.raise_for_status()
+
+            event_type, data = None, None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event_type = line.removeprefix("event:").strip()
+                elif line.startswith("data:"):
+                    data = line.removeprefix("data:").strip()
+                elif not line and event_type is not None:
+                    yield SenseEvent(type=event_type, **json.loads(data))
+                    event_type, data = None, None
@@ -35,12 +35,10 @@ class BackendType(str, enum.Enum):
     SOUL = "soul"
 
 
-class Sense(BaseModel):
+class SensePreview(BaseModel):
     id: uuid.UUID
     emotions: list[Emotion | EmotionLegacy] = []
     feelings: constr(min_length=1, strip_whitespace=True)
-    body: constr(min_length=1, strip_whitespace=True)
-    desires: constr(min_length=1, strip_whitespace=True)
     created_at: datetime
 
     @field_validator("created_at")
@@ -49,3 +47,8 @@ class Sense(BaseModel):
         created_at = created_at.replace(tzinfo=timezone.utc)
         local_timezone = datetime.now().astimezone().tzinfo
         return created_at.astimezone(local_timezone)
+
+
+class Sense(SensePreview):
+    body: constr(min_length=1, strip_whitespace=True)
+    desires: constr(min_length=1, strip_whitespace=True)
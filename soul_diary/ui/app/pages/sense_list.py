@@ -5,22 +5,33 @@ from datetime import datetime, timezone
 from functools import partial
 
 import flet
+import httpx
 
+from soul_diary.ui.app.backend.base import BaseBackend
+from soul_diary.ui.app.backend.exceptions import NonAuthenticatedException
+from soul_diary.ui.app.backend.models import SenseEvent, SenseEventType
 from soul_diary.ui.app.backend.utils import get_backend_client
 from soul_diary.ui.app.controls.utils import in_progress
 from soul_diary.ui.app.local_storage import LocalStorage
-from soul_diary.ui.app.models import Sense
+from soul_diary.ui.app.models import Emotion, Sense, SensePreview
 from soul_diary.ui.app.routes import AUTH, SENSE, SENSE_ADD
 from .base import BasePage, callback_error_handle
 
 
 class SenseListPage(BasePage):
+    EVENTS_RECONNECT_MIN_DELAY = 1.0
+    EVENTS_RECONNECT_MAX_DELAY = 30.0
+
     def __init__(self, view: flet.View, local_storage: LocalStorage, extend: bool = False):
         self.local_storage = local_storage
         self.senses = []
         self.next_cursor = None
+        self.created_to: datetime | None = None
+        self.emotion: Emotion | None = None
         self.lock = asyncio.Lock()
+        self.events_task: asyncio.Task | None = None
         self.senses_cards: flet.Column
+        self.months_dropdown: flet.Dropdown
         self.extend = extend
 
         super().__init__(view=view)
@@ -35,8 +46,23 @@ class SenseListPage(BasePage):
             value=self.extend,
             on_change=self.callback_switch_view,
         )
+        emotions_dropdown = flet.Dropdown(
+            hint_text="Эмоция",
+            width=200,
+            options=[flet.dropdown.Option(key="", text="Все эмоции")] + [
+                flet.dropdown.Option(key=emotion.value, text=emotion.value)
+                for emotion in Emotion
+            ],
+            on_change=self.callback_filter_emotion,
+        )
+        self.months_dropdown = flet.Dropdown(
+            hint_text="Перейти к месяцу",
+            width=200,
+            visible=False,
+            on_change=self.callback_jump_to_month,
+        )
         top_row_left = flet.Row(
-            controls=[view_switch],
+            controls=[view_switch, emotions_dropdown, self.months_dropdown],
             alignment=flet.MainAxisAlignment.START,
         )
         add_button = flet.IconButton(
@@ -72,17 +98,140 @@ class SenseListPage(BasePage):
 
     async def did_mount_async(self):
         backend_client = await get_backend_client(self.local_storage)
-        sense_list = await backend_client.get_sense_list()
+        await self.load_senses(backend_client=backend_client)
+        await self.render_cards()
+        await self.render_months(backend_client=backend_client)
+        self.events_task = asyncio.create_task(self.listen_events())
+
+    async def will_unmount_async(self):
+        if self.events_task is not None:
+            self.events_task.cancel()
+
+    async def listen_events(self):
+        # The stream is reopened whenever it drops, and the changes made meanwhile are caught up
+        # from the changes feed, so the list keeps following the diary.
+        backend_client = await get_backend_client(self.local_storage)
+        version, delay = None, self.EVENTS_RECONNECT_MIN_DELAY
+        while True:
+            try:
+                if delay > self.EVENTS_RECONNECT_MIN_DELAY:
+                    async with self.lock:
+                        version = await self.catch_up(
+                            backend_client=backend_client,
+                            version=version,
+                        )
+                async for sense_event in backend_client.listen_sense_events():
+                    delay = self.EVENTS_RECONNECT_MIN_DELAY
+                    async with self.lock:
+                        await self.apply_event(
+                            backend_client=backend_client,
+                            sense_event=sense_event,
+                        )
+                    version = sense_event.version
+            except NotImplementedError:
+                return
+            except NonAuthenticatedException:
+                await self.local_storage.clear_auth_data()
+                await self.page.go_async(AUTH)
+                return
+            except (httpx.HTTPError, ValueError):
+                pass
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.EVENTS_RECONNECT_MAX_DELAY)
+
+    async def catch_up(self, backend_client: BaseBackend, version: int | None) -> int | None:
+        if version is None:
+            await self.apply_event(
+                backend_client=backend_client,
+                sense_event=SenseEvent(type=SenseEventType.RESYNC, version=0),
+            )
+            return None
+
+        changes, new_version = await backend_client.fetch_sense_changes(since=version)
+        deleted_ids = [change.id for change in changes if change.deleted]
+        changed_ids = [change.id for change in changes if not change.deleted]
+        if deleted_ids:
+            await self.apply_event(
+                backend_client=backend_client,
+                sense_event=SenseEvent(
+                    type=SenseEventType.DELETED,
+                    version=new_version,
+                    sense_ids=deleted_ids,
+                ),
+            )
+        if changed_ids:
+            await self.apply_event(
+                backend_client=backend_client,
+                sense_event=SenseEvent(
+                    type=SenseEventType.UPDATED,
+                    version=new_version,
+                    sense_ids=changed_ids,
+                ),
+            )
+
+        return new_version
+
+    async def apply_event(self, backend_client: BaseBackend, sense_event: SenseEvent):
+        sense_ids = set(sense_event.sense_ids)
+
+        if sense_event.type == SenseEventType.RESYNC:
+            await self.load_senses(backend_client=backend_client)
+        elif sense_event.type == SenseEventType.DELETED:
+            self.senses = [sense for sense in self.senses if sense.id not in sense_ids]
+        else:
+            senses = await backend_client.get_senses(sense_ids=sense_event.sense_ids)
+            senses = {sense.id: sense for sense in senses if self.is_shown(sense)}
+            # Edited senses which don't match the filters anymore leave the list.
+            self.senses = [
+                senses.pop(sense.id, sense)
+                for sense in self.senses
+                if sense.id in senses or sense.id not in sense_ids
+            ]
+            # New senses beyond the loaded part of the list arrive with the next page.
+            oldest = self.senses[-1] if self.senses and self.next_cursor is not None else None
+            for sense in senses.values():
+                if oldest is None or (sense.created_at, sense.id) > (oldest.created_at, oldest.id):
+                    self.senses.append(sense)
+            self.senses.sort(key=lambda sense: (sense.created_at, sense.id), reverse=True)
+
+        await self.render_cards()
+
+    def is_shown(self, sense: SensePreview) -> bool:
+        return (
+            (self.created_to is None or sense.created_at < self.created_to) and
+            (self.emotion is None or self.emotion in sense.emotions)
+        )
+
+    async def load_senses(self, backend_client: BaseBackend):
+        # Compact cards need previews only, the extended ones show whole senses.
+        sense_list = await backend_client.get_sense_list(
+            created_to=self.created_to,
+            emotion=self.emotion,
+            full=self.extend,
+        )
         self.senses = sense_list.data
         self.next_cursor = sense_list.next
-        await self.render_cards()
 
     async def render_cards(self):
         function = self.render_extend_card if self.extend else self.render_compact_card
         self.senses_cards.controls = [await function(sense) for sense in self.senses]
         await self.update_async()
 
-    async def render_compact_card(self, sense: Sense) -> flet.Card:
+    async def render_months(self, backend_client: BaseBackend):
+        try:
+            months = await backend_client.fetch_sense_histogram()
+        except NotImplementedError:
+            return
+
+        self.months_dropdown.options = [flet.dropdown.Option(key="", text="Все записи")] + [
+            flet.dropdown.Option(key=month.month, text=f"{month.month} ({month.count})")
+            for month in months
+        ]
+        self.months_dropdown.visible = bool(months)
+        await self.update_async()
+
+    async def render_compact_card(self, sense: SensePreview) -> flet.Card:
         feelings = flet.Container(content=flet.Text(sense.feelings), expand=True)
         created_datetime = flet.Text(sense.created_at.strftime("%d %b %H:%M"))
         emotions = flet.Row(
@@ -192,7 +341,37 @@ class SenseListPage(BasePage):
     async def callback_switch_view(self, event: flet.ControlEvent):
         self.extend = event.control.value
         await self.local_storage.add_client_data(key="extend_list_view", value=self.extend)
-        await self.render_cards()
+        async with self.lock:
+            if self.extend:
+                backend_client = await get_backend_client(local_storage=self.local_storage)
+                await self.load_senses(backend_client=backend_client)
+            await self.render_cards()
+
+    @callback_error_handle
+    async def callback_jump_to_month(self, event: flet.ControlEvent):
+        # The list starts at the end of the chosen (UTC) month, so older entries are reached
+        # in one request instead of scrolling through every newer page.
+        self.created_to = None
+        if event.control.value:
+            year, month = map(int, event.control.value.split("-"))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            self.created_to = datetime(year, month, 1, tzinfo=timezone.utc)
+
+        async with self.lock:
+            backend_client = await get_backend_client(local_storage=self.local_storage)
+            await self.load_senses(backend_client=backend_client)
+            await self.render_cards()
+
+    @callback_error_handle
+    async def callback_filter_emotion(self, event: flet.ControlEvent):
+        # Senses are matched by the server through emotion tokens, so only the matching
+        # pages are downloaded and decrypted.
+        self.emotion = Emotion(event.control.value) if event.control.value else None
+
+        async with self.lock:
+            backend_client = await get_backend_client(local_storage=self.local_storage)
+            await self.load_senses(backend_client=backend_client)
+            await self.render_cards()
 
     @callback_error_handle
     async def callback_card_click(self, event: flet.ControlEvent, sense_id: uuid.UUID):
@@ -222,7 +401,12 @@ class SenseListPage(BasePage):
         async with self.lock:
             backend_client = await get_backend_client(local_storage=self.local_storage)
             async with self.in_progress():
-                sense_list = await backend_client.get_sense_list(cursor=self.next_cursor)
+                sense_list = await backend_client.get_sense_list(
+                    cursor=self.next_cursor,
+                    created_to=self.created_to,
+                    emotion=self.emotion,
+                    full=self.extend,
+                )
             self.senses.extend(sense_list.data)
             self.next_cursor = sense_list.next
             await self.render_cards()
@@ -0,0 +1,43 @@
+import unittest
+
+from Cryptodome.Cipher import AES
+
+from soul_diary.ui.app.backend.base import BaseBackend
+
+
+class EnvelopeTestCase(unittest.TestCase):
+    DATA = {"emotions": [], "feelings": "feelings", "body": "body", "desires": "desires"}
+
+    def setUp(self):
+        self.backend = BaseBackend(local_storage=None, username="user", encryption_key="0" * 16)
+
+    def test_round_trip(self):
+        for version in BaseBackend.ENVELOPE_MODES:
+            with self.subTest(version=version):
+                self.backend.ENVELOPE_VERSION = version
+                data = self.backend.encode(self.DATA)
+                self.assertEqual(self.backend.decode(data), self.DATA)
+
+    def test_legacy_record(self):
+        cipher = AES.new(b"0" * 16, BaseBackend.LEGACY_MODE, nonce=BaseBackend.LEGACY_NONCE)
+        data = cipher.encrypt(b'{"feelings":"feelings"}')
+        self.assertEqual(self.backend.decode(data), {"feelings": "feelings"})
+
+    def test_tampered_envelope(self):
+        for version in BaseBackend.ENVELOPE_MODES:
+            with self.subTest(version=version):
+                self.backend.ENVELOPE_VERSION = version
+                data = bytearray(self.backend.encode(self.DATA))
+                data[-1] ^= 0x01
+                with self.assertRaisesRegex(ValueError, "sense data failed authentication"):
+                    self.backend.decode(bytes(data))
+
+    def test_wrong_key(self):
+        data = self.backend.encode(self.DATA)
+        backend = BaseBackend(local_storage=None, username="user", encryption_key="1" * 16)
+        with self.assertRaisesRegex(ValueError, "sense data failed authentication"):
+            backend.decode(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import pathlib
+import tempfile
+import unittest
+from datetime import datetime
+
+from soul_diary.backend.database import DatabaseService
+from soul_diary.backend.database.events import SenseEventType
+
+
+class ImportSensesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = pathlib.Path(self.directory.name) / "database.sqlite3"
+        self.database = DatabaseService(dsn=f"sqlite+aiosqlite:///{path}")
+        self.database.migrate()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_import_revives_deleted_senses(self):
+        asyncio.run(self.import_revives_deleted_senses())
+
+    async def import_revives_deleted_senses(self):
+        async with self.database:
+            async with self.database.transaction() as session:
+                user = await self.database.create_user(
+                    session=session,
+                    username="user",
+                    password="password",
+                )
+            async with self.database.transaction() as session:
+                sense = await self.database.create_sense(
+                    session=session,
+                    user_id=user.id,
+                    data=b"data",
+                )
+            async with self.database.transaction() as session:
+                await self.database.delete_sense(
+                    session=session,
+                    sense_id=sense.id,
+                    user_id=user.id,
+                )
+
+            created_at = datetime(2020, 1, 1)
+            with self.database.event_bus.subscribe(user_id=user.id) as queue:
+                async with self.database.transaction() as session:
+                    imported = await self.database.import_senses(
+                        session=session,
+                        user_id=user.id,
+                        senses=[{
+                            "id": sense.id,
+                            "data": b"restored",
+                            "preview": b"preview",
+                            "created_at": created_at,
+                        }],
+                    )
+                sense_event = queue.get_nowait()
+
+            async with self.database.session(read_only=True) as session:
+                restored = await self.database.get_sense(session=session, sense_id=sense.id)
+                user_data = await self.database.get_user_data(session=session, user_id=user.id)
+                changes, version, _ = await self.database.get_sense_changes(
+                    session=session,
+                    user_id=user.id,
+                    since=sense_event.version - 1,
+                )
+
+        self.assertEqual(imported, 1)
+        self.assertEqual(restored.data, b"restored")
+        self.assertEqual(restored.created_at, created_at)
+        self.assertEqual(user_data.senses_count, 1)
+        self.assertEqual(sense_event.type, SenseEventType.CREATED)
+        self.assertEqual(sense_event.sense_ids, [sense.id])
+        self.assertEqual([change.id for change in changes], [sense.id])
+        self.assertIsNone(changes[0].deleted_at)
+        self.assertEqual(version, sense_event.version)
+
+    def test_import_skips_existing_senses(self):
+        asyncio.run(self.import_skips_existing_senses())
+
+    async def import_skips_existing_senses(self):
+        async with self.database:
+            async with self.database.transaction() as session:
+                user = await self.database.create_user(
+                    session=session,
+                    username="user",
+                    password="password",
+                )
+            async with self.database.transaction() as session:
+                sense = await self.database.create_sense(
+                    session=session,
+                    user_id=user.id,
+                    data=b"data",
+                )
+            async with self.database.transaction() as session:
+                imported = await self.database.import_senses(
+                    session=session,
+                    user_id=user.id,
+                    senses=[{"id": sense.id, "data": b"other", "created_at": datetime(2020, 1, 1)}],
+                )
+
+            async with self.database.session(read_only=True) as session:
+                existing = await self.database.get_sense(session=session, sense_id=sense.id)
+                user_data = await self.database.get_user_data(session=session, user_id=user.id)
+
+        self.assertEqual(imported, 0)
+        self.assertEqual(existing.data, b"data")
+        self.assertEqual(user_data.senses_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import asyncio
+import pathlib
+import tempfile
+import unittest
+
+from soul_diary.backend.database import DatabaseService
+
+
+class QueryPlansTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = pathlib.Path(self.directory.name) / "database.sqlite3"
+        self.database = DatabaseService(dsn=f"sqlite+aiosqlite:///{path}")
+        self.database.migrate()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def explain_hot_queries(self, drop_index: str | None = None):
+        async with self.database:
+            if drop_index is not None:
+                async with self.database.transaction() as session:
+                    connection = await session.connection()
+                    await connection.exec_driver_sql(f"DROP INDEX {drop_index}")
+            return await self.database.explain_hot_queries()
+
+    def test_hot_queries_use_indexes(self):
+        plans = asyncio.run(self.explain_hot_queries())
+
+        for name, (plan, uses_index) in plans.items():
+            with self.subTest(query=name):
+                self.assertTrue(uses_index, "\n".join(plan))
+
+    def test_sort_of_all_rows_fails(self):
+        # Without the index the user's senses are still searched by an index on user_id, but
+        # sorted as a whole before the page is cut.
+        plans = asyncio.run(
+            self.explain_hot_queries(drop_index="senses__user_id__created_at__id_idx"),
+        )
+
+        plan, uses_index = plans["get_senses"]
+        self.assertFalse(uses_index, "\n".join(plan))
+
+
+if __name__ == "__main__":
+    unittest.main()